@@ -1,2 +1,17 @@
-from astprint.code import as_code
-from astprint.tree import as_tree
+__version__ = "1.0.1+dev"
+
+from astprint.code import as_code, write_code
+from astprint.tree import as_tree, iter_tree
+from astprint.batch import as_code_many, as_tree_many
+from astprint.aio import as_code_async, as_tree_async
+from astprint.resumable import ResumableRenderer, RenderCancelled
+from astprint.cache import RenderCache
+from astprint.incremental import as_code_incremental
+from astprint.sourcemap import SourceMap
+from astprint.stats import RenderStats
+from astprint.jsontree import as_json, write_json, write_ndjson
+from astprint.loader import load_tree
+from astprint.rope import Rope
+from astprint.diff import tree_diff
+from astprint.structure import fingerprint
+from astprint.diskcache import DiskCache
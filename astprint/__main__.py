@@ -0,0 +1,6 @@
+import sys
+
+from astprint.cli import main
+
+
+sys.exit(main())
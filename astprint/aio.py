@@ -0,0 +1,109 @@
+"""
+Rendering from `asyncio` code without blocking the event loop.
+"""
+
+import asyncio
+import functools
+import time
+
+from astprint.code import as_code, LineBreakingVisitor, SourceGeneratorNodeVisitor
+from astprint.tree import as_tree, ASTPrinter, CompactASTPrinter
+from astprint.walker import iter_walk
+
+
+async def as_code_async(node, indent="    ", max_line_length=None,
+                        max_line_gap=None, line_map=None,
+                        every=1000, interval=None, executor=None):
+    """
+    Returns the same string as `as_code(node, indent,
+    max_line_length=max_line_length, max_line_gap=max_line_gap,
+    line_map=line_map)`, suspending the rendering
+    to let the event loop run other tasks.
+
+    The control is given back to the event loop after every `every` nodes;
+    if `interval` (in seconds) is given, the clock is checked after every
+    `every` nodes instead, and the control is given back when at least
+    `interval` seconds passed since the last time.
+
+    If `executor` (a `concurrent.futures.Executor`) is given,
+    the whole rendering is done in it instead, and the coroutine
+    just waits for the result (`line_map` is then filled in this process,
+    as the executor may not share the memory with it).
+    """
+    if executor is not None:
+        if line_map is None:
+            return await _run_in_executor(
+                executor, as_code, node, indent,
+                max_line_length=max_line_length, max_line_gap=max_line_gap)
+        code, lines = await _run_in_executor(
+            executor, _as_code_with_line_map, node, indent,
+            max_line_length, max_line_gap)
+        line_map.extend(lines)
+        return code
+
+    if max_line_length is not None:
+        visitor = LineBreakingVisitor(
+            indent, max_line_length, max_line_gap=max_line_gap)
+    else:
+        visitor = SourceGeneratorNodeVisitor(indent, max_line_gap=max_line_gap)
+    await _walk(visitor, node, every, interval)
+    if max_line_length is not None:
+        visitor.end_line()
+    code = visitor.dumps()
+    if line_map is not None:
+        leading_newlines = len(code) - len(code.lstrip("\n"))
+        line_map.extend(
+            (line - leading_newlines, lineno)
+            for line, lineno in visitor.line_map)
+    return code.strip("\n")
+
+
+async def as_tree_async(node, indent="  ", width=None,
+                        every=1000, interval=None, executor=None):
+    """
+    Returns the same string as `as_tree(node, indent, width=width)`;
+    see `as_code_async` for the description of the other parameters.
+    """
+    if executor is not None:
+        return await _run_in_executor(
+            executor, as_tree, node, indent, width=width)
+
+    if width is not None:
+        visitor = CompactASTPrinter(indent, width, node)
+    else:
+        visitor = ASTPrinter(indent)
+    await _walk(visitor, node, every, interval)
+    return visitor.dumps()
+
+
+def _as_code_with_line_map(node, indent, max_line_length, max_line_gap):
+    line_map = []
+    code = as_code(
+        node, indent, max_line_length=max_line_length,
+        max_line_gap=max_line_gap, line_map=line_map)
+    return code, line_map
+
+
+def _run_in_executor(executor, func, *args, **kwds):
+    loop = asyncio.get_running_loop()
+    return loop.run_in_executor(executor, functools.partial(func, *args, **kwds))
+
+
+async def _walk(visitor, node, every, interval):
+    if every < 1:
+        raise ValueError("every must be a positive integer")
+
+    countdown = every
+    last_pause = time.monotonic()
+    for _ in iter_walk(visitor, node):
+        countdown -= 1
+        if countdown:
+            continue
+        countdown = every
+        if interval is not None:
+            now = time.monotonic()
+            if now - last_pause < interval:
+                continue
+        await asyncio.sleep(0)
+        if interval is not None:
+            last_pause = time.monotonic()
@@ -0,0 +1,77 @@
+"""
+Rendering of many trees at once with a `concurrent.futures` executor.
+"""
+
+import collections
+import itertools
+import os
+
+from astprint.code import as_code
+from astprint.tree import as_tree
+
+
+def as_code_many(nodes, indent="    ", executor=None, chunksize=1, prefetch=None):
+    """
+    Yields `as_code(node, indent)` for each node in `nodes`, in the same order.
+
+    If `executor` (a `concurrent.futures.Executor`) is given, nodes are
+    rendered in it in groups of `chunksize` (larger chunks reduce the pickling
+    overhead of process pools). At most `prefetch` chunks (by default, four
+    per CPU) are submitted ahead of the one whose results are being yielded,
+    so `nodes` can be an arbitrarily long iterable.
+    """
+    return _render_many(as_code, nodes, indent, executor, chunksize, prefetch)
+
+
+def as_tree_many(nodes, indent="  ", executor=None, chunksize=1, prefetch=None):
+    """
+    Yields `as_tree(node, indent)` for each node in `nodes`, in the same order.
+    See `as_code_many` for the description of the other parameters.
+    """
+    return _render_many(as_tree, nodes, indent, executor, chunksize, prefetch)
+
+
+def _render_chunk(func, nodes, indent):
+    return [func(node, indent) for node in nodes]
+
+
+def _chunks(iterable, chunksize):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, chunksize))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _render_many(func, nodes, indent, executor, chunksize, prefetch):
+    # Checked before the generator is created,
+    # so that the error is raised at the call and not at the first result
+    if chunksize < 1:
+        raise ValueError("chunksize must be a positive integer")
+    return _render_results(func, nodes, indent, executor, chunksize, prefetch)
+
+
+def _render_results(func, nodes, indent, executor, chunksize, prefetch):
+    if executor is None:
+        for node in nodes:
+            yield func(node, indent)
+        return
+
+    if prefetch is None:
+        prefetch = 4 * (os.cpu_count() or 1)
+
+    pending = collections.deque()
+    try:
+        for chunk in _chunks(nodes, chunksize):
+            pending.append(executor.submit(_render_chunk, func, chunk, indent))
+            if len(pending) > prefetch:
+                for result in pending.popleft().result():
+                    yield result
+        while pending:
+            for result in pending.popleft().result():
+                yield result
+    finally:
+        # If the consumer stops early, do not leave the executor busy
+        for future in pending:
+            future.cancel()
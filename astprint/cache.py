@@ -0,0 +1,127 @@
+"""
+Memoization of rendered subtrees.
+"""
+
+import ast
+import collections
+import sys
+import weakref
+
+from astprint.structure import fingerprint
+
+
+class RenderCache(object):
+    """
+    A bounded cache of rendered subtrees which can be passed to
+    `as_code` and `as_tree` as the `cache` argument.
+
+    Statements and expressions consisting of at least `min_nodes` nodes
+    are looked up by their structure (not by object identity),
+    so an unchanged subtree is copied from the cache instead of being visited,
+    even if it belongs to a different tree object.
+    Least recently used entries are evicted when the total size
+    of the cached text exceeds `max_bytes`.
+
+    The structure of a subtree is found by hashing it (see `fingerprint`),
+    which takes about as long as rendering it, so the digests of the rendered
+    trees are kept (as long as the nodes exist), and rendering the same tree
+    objects again only looks them up.
+    Hence the rendered trees must not be changed in place afterwards,
+    unless `clear()` is called; a changed tree may still share its
+    unchanged subtrees (as the same objects) with the rendered ones,
+    and only the new nodes are hashed then.
+    """
+
+    def __init__(self, max_bytes=16 * 1024 * 1024, min_nodes=8):
+        self.max_bytes = max_bytes
+        self.min_nodes = min_nodes
+        self.entries = collections.OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # Digests of the rendered nodes for each tuple of `digest_attributes`
+        self.digests = {}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def stats(self):
+        return dict(
+            hits=self.hits, misses=self.misses, evictions=self.evictions,
+            entries=len(self.entries), size=self.size)
+
+    def clear(self):
+        self.entries.clear()
+        self.size = 0
+        self.digests.clear()
+
+    def get(self, key):
+        try:
+            value, _ = self.entries[key]
+        except KeyError:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        size = sys.getsizeof(value[0])
+        if size > self.max_bytes:
+            return
+
+        old = self.entries.pop(key, None)
+        if old is not None:
+            self.size -= old[1]
+
+        self.entries[key] = (value, size)
+        self.size += size
+        while self.size > self.max_bytes:
+            _, (_, evicted_size) = self.entries.popitem(last=False)
+            self.size -= evicted_size
+            self.evictions += 1
+
+    def wrapper(self, visitor, root):
+        """
+        Returns a dispatch table wrapper (see `WalkingVisitor.wrappers`)
+        making `visitor` use this cache while rendering `root`.
+
+        The visitor must provide `digest_attributes`, `cache_key(node, digest)`,
+        `mark()`, `recorded(mark)` and `splice(value)`.
+        """
+        attributes = visitor.digest_attributes
+        digests = self.digests.get(attributes)
+        if digests is None:
+            digests = self.digests[attributes] = weakref.WeakKeyDictionary()
+        fingerprint(root, digests, attributes)
+        min_nodes = self.min_nodes
+
+        def wrap(node_class, method):
+            if not issubclass(node_class, (ast.stmt, ast.expr)):
+                return method
+
+            def visit(visitor, node):
+                digest, size = digests.get(node, (None, 0))
+                if size < min_nodes:
+                    return method(visitor, node)
+
+                key = visitor.cache_key(node, digest)
+                value = self.get(key)
+                if value is not None:
+                    visitor.splice(value)
+                    return None
+
+                mark = visitor.mark()
+                return self._record(visitor, key, mark, method(visitor, node))
+
+            return visit
+
+        return wrap
+
+    def _record(self, visitor, key, mark, gen):
+        if gen is not None:
+            yield gen
+        value = visitor.recorded(mark)
+        if value is not None:
+            self.put(key, value)
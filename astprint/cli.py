@@ -0,0 +1,197 @@
+"""
+Command-line interface: renders Python source files with `as_code`,
+`as_tree` or `as_json`.
+"""
+
+import argparse
+import ast
+import concurrent.futures
+import functools
+import json
+import os
+import sys
+import time
+
+from astprint.diskcache import DiskCache, RENDERERS
+
+
+EXTENSIONS = dict(code='.py', tree='.tree', json='.json')
+
+
+def find_sources(paths):
+    """
+    Yields `(path, relative_path)` for every file in `paths`,
+    and for every `.py` file in the directories among them (recursively,
+    in sorted order); `relative_path` is relative to the given directory,
+    or just the file name for files given directly.
+    """
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path, os.path.basename(path)
+            continue
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                if name.endswith('.py'):
+                    full_path = os.path.join(root, name)
+                    yield full_path, os.path.relpath(full_path, path)
+
+
+# Disk caches of the current process, by directory
+_disk_caches = {}
+
+
+def disk_cache(directory):
+    try:
+        return _disk_caches[directory]
+    except KeyError:
+        cache = DiskCache(directory)
+        _disk_caches[directory] = cache
+        return cache
+
+
+def render_file(options, path):
+    """
+    Parses and renders a file, returning `(text, error, size, seconds)`,
+    where either `text` or `error` (a description of the exception
+    raised while reading, parsing or rendering the file) is `None`.
+    Used in the worker processes, so only the path and the result
+    are passed between processes, and not the tree.
+    """
+    start = time.perf_counter()
+    try:
+        with open(path, 'rb') as f:
+            source = f.read()
+        if options.mode == 'code':
+            render_options = dict(
+                indent=options.indent, max_line_length=options.max_line_length,
+                max_line_gap=options.max_line_gap)
+        elif options.mode == 'tree':
+            render_options = dict(indent=options.indent, width=options.width)
+        else:
+            render_options = {}
+
+        if options.cache is not None:
+            text = disk_cache(options.cache).render(
+                source, options.mode, **render_options)
+        else:
+            text = RENDERERS[options.mode](
+                ast.parse(source, path), **render_options)
+    except Exception as e:
+        # Any failure (including an error in a renderer) is reported
+        # for this file only, and the other files are still processed
+        return None, "{0}: {1}".format(type(e).__name__, e), 0, 0.0
+    return text, None, len(source), time.perf_counter() - start
+
+
+def write_result(options, path, relative_path, text, several):
+    """
+    Writes the result for one file to the output directory,
+    or to standard output. If `several` files are written to standard output,
+    the result of each one is preceded by a `# path` line,
+    or, for JSON, put on a line of its own as `{"path": ..., "tree": ...}`.
+    """
+    if options.output is None:
+        if several:
+            if options.mode == 'json':
+                text = '{{"path": {0}, "tree": {1}}}'.format(
+                    json.dumps(path), text)
+            else:
+                sys.stdout.write("# " + path + "\n")
+        sys.stdout.write(text + "\n")
+        return
+    output_path = os.path.join(
+        options.output,
+        os.path.splitext(relative_path)[0] + EXTENSIONS[options.mode])
+    directory = os.path.dirname(output_path)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory)
+    with open(output_path, 'w', encoding='utf-8') as f:
+        f.write(text + "\n")
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        prog='astprint',
+        description="Renders Python source files back as code, "
+            "or as their syntax trees.")
+    parser.add_argument('paths', nargs='+', metavar='PATH',
+        help="files, or directories to search for .py files")
+    parser.add_argument('--mode', choices=sorted(EXTENSIONS), default='code',
+        help="what to render: code (as_code), tree (as_tree) or json (as_json)")
+    parser.add_argument('--indent', default=None,
+        help="indentation string (four spaces for code, two for tree)")
+    parser.add_argument('--max-line-length', type=int, default=None,
+        help="break longer lines of code (see as_code)")
+    parser.add_argument('--max-line-gap', type=int, default=None,
+        help="insert at most this many blank lines to align statements "
+            "to their line numbers (0 to ignore line numbers; see as_code)")
+    parser.add_argument('--width', type=int, default=None,
+        help="put tree nodes fitting into this width on one line (see as_tree)")
+    parser.add_argument('-o', '--output', default=None,
+        help="directory to write the results to (by default, standard output)")
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+        help="number of worker processes (0 for one per CPU)")
+    parser.add_argument('--chunksize', type=int, default=1,
+        help="number of files sent to a worker at once")
+    parser.add_argument('--cache', default=None, metavar='DIRECTORY',
+        help="keep the results in a persistent cache in this directory, "
+            "and take the results for unchanged files from it")
+    parser.add_argument('--timing', action='store_true',
+        help="report the time spent on each file and the throughput "
+            "to standard error")
+    options = parser.parse_args(argv)
+    if options.indent is None:
+        options.indent = "    " if options.mode == 'code' else "  "
+    if options.jobs < 0:
+        parser.error("the number of jobs cannot be negative")
+    if options.chunksize < 1:
+        parser.error("chunksize must be a positive integer")
+    return options
+
+
+def main(argv=None):
+    options = parse_args(argv)
+    sources = list(find_sources(options.paths))
+    render = functools.partial(render_file, options)
+    paths = [path for path, _ in sources]
+
+    executor = None
+    if options.jobs != 1:
+        executor = concurrent.futures.ProcessPoolExecutor(options.jobs or None)
+
+    start = time.perf_counter()
+    total_size = 0
+    failures = 0
+    try:
+        if executor is None:
+            results = map(render, paths)
+        else:
+            # Results are yielded in order, as soon as each of them is ready
+            results = executor.map(render, paths, chunksize=options.chunksize)
+
+        for (path, relative_path), result in zip(sources, results):
+            text, error, size, seconds = result
+            if error is not None:
+                failures += 1
+                sys.stderr.write("{0}: {1}\n".format(path, error))
+                continue
+            write_result(options, path, relative_path, text, len(sources) > 1)
+            total_size += size
+            if options.timing:
+                sys.stderr.write("{0}: {1} bytes, {2:.4f} s\n".format(
+                    path, size, seconds))
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    if options.timing:
+        elapsed = time.perf_counter() - start
+        sys.stderr.write(
+            "{0} files, {1} bytes in {2:.3f} s ({3:.1f} files/s, {4:.2f} MB/s)\n"
+            .format(
+                len(sources) - failures, total_size, elapsed,
+                (len(sources) - failures) / elapsed if elapsed else 0.0,
+                total_size / elapsed / 1e6 if elapsed else 0.0))
+
+    return 1 if failures else 0
@@ -7,6 +7,9 @@ for https://github.com/konradhalas/astmonkey
 
 import ast
 
+from astprint.rope import Rope
+from astprint.walker import WalkingVisitor
+
 BOOLOP_SYMBOLS = {
     ast.And: 'and',
     ast.Or: 'or'
@@ -24,7 +27,8 @@ BINOP_SYMBOLS = {
     ast.BitOr: '|',
     ast.BitAnd: '&',
     ast.BitXor: '^',
-    ast.Pow: '**'
+    ast.Pow: '**',
+    ast.MatMult: '@'
 }
 
 CMPOP_SYMBOLS = {
@@ -47,14 +51,77 @@ UNARYOP_SYMBOLS = {
     ast.USub: '-'
 }
 
+# Precedence levels of expressions, from the loosest binding to the tightest
+(
+    PRECEDENCE_TUPLE,
+    PRECEDENCE_YIELD,
+    PRECEDENCE_TEST,  # `if`-`else` and `lambda`
+    PRECEDENCE_OR,
+    PRECEDENCE_AND,
+    PRECEDENCE_NOT,
+    PRECEDENCE_CMP,
+    PRECEDENCE_BOR,
+    PRECEDENCE_BXOR,
+    PRECEDENCE_BAND,
+    PRECEDENCE_SHIFT,
+    PRECEDENCE_ARITH,
+    PRECEDENCE_TERM,
+    PRECEDENCE_FACTOR,  # unary `+`, `-` and `~`
+    PRECEDENCE_POWER,
+    PRECEDENCE_ATOM,
+) = range(16)
+
+BOOLOP_PRECEDENCE = {
+    ast.And: PRECEDENCE_AND,
+    ast.Or: PRECEDENCE_OR
+}
+
+BINOP_PRECEDENCE = {
+    ast.Add: PRECEDENCE_ARITH,
+    ast.Sub: PRECEDENCE_ARITH,
+    ast.Mult: PRECEDENCE_TERM,
+    ast.Div: PRECEDENCE_TERM,
+    ast.FloorDiv: PRECEDENCE_TERM,
+    ast.Mod: PRECEDENCE_TERM,
+    ast.LShift: PRECEDENCE_SHIFT,
+    ast.RShift: PRECEDENCE_SHIFT,
+    ast.BitOr: PRECEDENCE_BOR,
+    ast.BitAnd: PRECEDENCE_BAND,
+    ast.BitXor: PRECEDENCE_BXOR,
+    ast.Pow: PRECEDENCE_POWER,
+    ast.MatMult: PRECEDENCE_TERM
+}
+
 ALL_SYMBOLS = {}
 ALL_SYMBOLS.update(BOOLOP_SYMBOLS)
 ALL_SYMBOLS.update(BINOP_SYMBOLS)
 ALL_SYMBOLS.update(CMPOP_SYMBOLS)
 ALL_SYMBOLS.update(UNARYOP_SYMBOLS)
 
+DEFAULT_BUFFER_SIZE = 64 * 1024
+
+
+def constant_value(node):
+    """
+    Returns the value of a numeric constant node, or `None`.
+    """
+    if isinstance(node, ast.Constant):
+        return node.value
+    if isinstance(node, getattr(ast, 'Num', ())):
+        return node.n
+    return None
+
+
+def keyword_prefix(keyword):
+    if keyword.arg is None:
+        # Py>=3.5 syntax: `**kwargs` is a keyword without a name
+        return '**'
+    return keyword.arg + '='
 
-def as_code(node, indent="    "):
+
+def as_code(node, indent="    ", cache=None, source_map=None, stats=None,
+            max_line_length=None, max_line_gap=None, line_map=None,
+            rope=False):
     """
     This function can convert a node tree back into python sourcecode.
     This is useful for debugging purposes, especially if you're dealing with
@@ -68,46 +135,287 @@ def as_code(node, indent="    "):
     Each level of indentation is replaced with `indent`. Per default this
     parameter is equal to four spaces as suggested by PEP 8, but it might be
     adjusted to match the application's styleguide.
+
+    If `cache` (a `RenderCache` object) is given, rendered statements and
+    expressions are stored in it and reused in subsequent calls.
+
+    If `source_map` (a `SourceMap` object) is given, it is filled with
+    the output positions of the visited nodes.
+
+    If `stats` (a `RenderStats` object) is given, it is filled with
+    the visited node counts and the time spent in the visiting methods.
+
+    If `max_line_length` is given, lines longer than that are broken
+    inside the brackets of calls, literals and comprehensions
+    (see `LineBreakingVisitor`); it cannot be combined with `source_map`.
+
+    Statements are aligned to their `lineno` by inserting blank lines.
+    If `max_line_gap` is given, at most that many blank lines are inserted
+    at once, and the output lines of the following statements are shifted
+    by the difference; with `max_line_gap=0`, line numbers are ignored.
+    If `line_map` (a list) is given as well, it is extended with
+    `(line, lineno)` pairs for the first statement and for every shortened
+    gap, meaning that the output lines starting from `line` (up to the line
+    of the next pair) correspond to the source lines starting from `lineno`.
+
+    If `rope` is `True`, a `Rope` of the rendered pieces is returned
+    instead of a string (a source map still needs the whole text, though).
     """
-    visitor = SourceGeneratorNodeVisitor(indent)
+    if max_line_length is not None:
+        if source_map is not None:
+            raise ValueError("A source map cannot be used with max_line_length")
+        visitor = LineBreakingVisitor(
+            indent, max_line_length, max_line_gap=max_line_gap)
+    else:
+        visitor = SourceGeneratorNodeVisitor(indent, max_line_gap=max_line_gap)
+    if cache is not None:
+        visitor.wrappers.append(cache.wrapper(visitor, node))
+    if source_map is not None:
+        visitor.wrappers.append(source_map.wrapper(visitor))
+    if stats is not None:
+        visitor.wrappers.append(stats.wrapper(visitor))
     visitor.visit(node)
-    return visitor.dumps().strip("\n")
+    if rope:
+        stripped = Rope(visitor.result)
+        leading_newlines = stripped.strip_newlines()
+    else:
+        code = visitor.dumps()
+        stripped = code.strip("\n")
+        leading_newlines = len(code) - len(code.lstrip("\n"))
+    if source_map is not None:
+        source_map.finish(str(stripped), leading_newlines)
+    if line_map is not None:
+        line_map.extend(
+            (line - leading_newlines, lineno)
+            for line, lineno in visitor.line_map)
+    if stats is not None:
+        stats.characters += len(stripped)
+    return stripped
+
+
+def write_code(node, fp, indent="    ", buffer_size=DEFAULT_BUFFER_SIZE,
+               max_line_length=None, max_line_gap=None, line_map=None):
+    """
+    Writes the same source code as `as_code` would return to a file-like
+    object `fp`, without keeping the whole output in memory.
 
+    The generated text is passed to `fp.write()` every time roughly
+    `buffer_size` characters have been accumulated.
+    """
+    sink = _NewlineStripper(fp)
+    if max_line_length is not None:
+        visitor = LineBreakingVisitor(
+            indent, max_line_length, sink=sink, buffer_size=buffer_size,
+            max_line_gap=max_line_gap)
+    else:
+        visitor = SourceGeneratorNodeVisitor(
+            indent, sink=sink, buffer_size=buffer_size,
+            max_line_gap=max_line_gap)
+    visitor.visit(node)
+    visitor.flush()
+    if line_map is not None:
+        line_map.extend(
+            (line - sink.leading_newlines, lineno)
+            for line, lineno in visitor.line_map)
 
-class SourceGeneratorNodeVisitor(ast.NodeVisitor):
+
+class _NewlineStripper(object):
+    """
+    Passes text through to `fp`, dropping the leading and the trailing
+    newlines of the whole stream (like `str.strip("\n")` would).
+    """
+
+    def __init__(self, fp):
+        self.fp = fp
+        self.started = False
+        self.pending_newlines = 0
+        self.leading_newlines = 0
+
+    def write(self, text):
+        if not self.started:
+            stripped = text.lstrip("\n")
+            self.leading_newlines += len(text) - len(stripped)
+            text = stripped
+            if not text:
+                return
+            self.started = True
+
+        stripped = text.rstrip("\n")
+        if stripped:
+            if self.pending_newlines:
+                self.fp.write("\n" * self.pending_newlines)
+            self.fp.write(stripped)
+            self.pending_newlines = len(text) - len(stripped)
+        else:
+            self.pending_newlines += len(text)
+
+
+class SourceGeneratorNodeVisitor(WalkingVisitor):
     """
     This visitor is able to transform a well formed syntax tree into python
     sourcecode. For more details have a look at the docstring of the
     `as_code` function.
+
+    The visiting methods are generators driven by `WalkingVisitor`,
+    and so are the helpers `body()`, `body_or_else()`, `signature()`
+    and `decorators()`: a subclass has to `yield` them from its own
+    visiting methods, since calling them without that renders nothing.
     """
 
-    def __init__(self, indent):
+    def __init__(self, indent, sink=None, buffer_size=DEFAULT_BUFFER_SIZE,
+                 max_line_gap=None):
         self.result = []
         self.indent_with = indent
         self.indentation = 0
         self.new_line = False
+        # If `sink` is given, the accumulated output is passed to
+        # `sink.write()` and dropped every `buffer_size` characters.
+        self.sink = sink
+        self.buffer_size = buffer_size
+        self.buffered = 0
+        self.flushes = 0
+        self.started = False
+        self.wrappers = []
+        # Running position of the end of the output, so that line alignment
+        # does not have to re-scan everything written so far.
+        # `lines` counts lines the same way `len(output.split('\n'))` would.
+        self.lines = 1
+        self.column = 0
+        self.offset = 0
+        self._indents = [""]
+        # The precedence each expression needs in order to be written
+        # without parentheses, set by the nodes containing it
+        # (`PRECEDENCE_TEST`, if not set).
+        self.precedences = {}
+        # The maximum number of blank lines inserted for the line alignment
+        # (see `as_code`), the number of lines the output is shifted up by,
+        # and the `(line, lineno)` pairs recorded where the shift changes
+        self.max_line_gap = max_line_gap
+        self.line_shift = 0
+        self.line_map = []
+        if max_line_gap == 0:
+            # The output does not depend on the line numbers
+            self.digest_attributes = ()
 
     def dumps(self):
         return "".join(self.result)
 
     def write(self, text, node=None):
         self.correct_line_number(node)
+        self.append(text)
+
+    def flush(self):
+        if self.sink is not None and self.result:
+            self.sink.write("".join(self.result))
+            del self.result[:]
+            self.buffered = 0
+            self.flushes += 1
+
+    def append(self, text):
         self.result.append(text)
+        self.started = True
+        length = len(text)
+        self.offset += length
+        if self.sink is not None:
+            self.buffered += length
+            if self.buffered >= self.buffer_size:
+                self.flush()
+        newlines = text.count('\n')
+        if newlines:
+            self.lines += newlines
+            self.column = length - text.rindex('\n') - 1
+        else:
+            self.column += length
+
+    def indent_string(self):
+        try:
+            return self._indents[self.indentation]
+        except IndexError:
+            while len(self._indents) <= self.indentation:
+                self._indents.append(self.indent_with * len(self._indents))
+            return self._indents[self.indentation]
 
     def correct_line_number(self, node):
         if self.new_line:
-            if self.result:
-                self.result.append('\n')
-            self.result.append(self.indent_with * self.indentation)
+            if self.started:
+                self.append('\n')
+            self.append(self.indent_string())
             self.new_line = False
 
-        if node and hasattr(node, 'lineno'):
-            lines = len("".join(self.result).split('\n')) if self.result else 0
-            line_diff = node.lineno - lines
-
-            if line_diff:
-                self.result.append(
-                    ('\n' + (self.indent_with * self.indentation)) * line_diff)
+        if node and hasattr(node, 'lineno') and self.max_line_gap != 0:
+            lines = self.lines if self.started else 0
+            line_diff = node.lineno - self.line_shift - lines
+            max_line_gap = self.max_line_gap
+            mapped = max_line_gap is not None and (
+                line_diff > max_line_gap or not self.line_map)
+            if mapped and line_diff > max_line_gap:
+                self.line_shift += line_diff - max_line_gap
+                line_diff = max_line_gap
+
+            if line_diff > 0:
+                self.append(('\n' + self.indent_string()) * line_diff)
+            if mapped:
+                self.line_map.append((self.lines, node.lineno))
+
+    # `RenderCache` support.
+    # Line alignment makes the output of a statement depend on the position
+    # it starts at, while expressions never contain line breaks,
+    # unless they start the line of a statement without a visiting method
+    # of its own (see `WalkingVisitor.generic_visit`),
+    # so that the pending line break and indentation are written with them.
+    # Statements changing the line shift are not recorded, as splicing them
+    # would not change it.
+
+    digest_attributes = ('lineno',)
+
+    def cache_key(self, node, digest):
+        if isinstance(node, ast.expr):
+            key = ('code', digest, self.precedences.get(node, PRECEDENCE_TEST))
+            if not self.new_line:
+                return key
+            return key + (self.indent_with, self.indentation, self.started)
+        if self.max_line_gap == 0:
+            position = None
+        else:
+            position = (self.lines, self.line_shift, self.max_line_gap)
+        return ('code', digest, self.indent_with, self.indentation,
+            position, self.started, self.new_line)
+
+    def mark(self):
+        return len(self.result), self.flushes, len(self.line_map)
+
+    def recorded(self, mark):
+        start, flushes, line_map_size = mark
+        if flushes != self.flushes or line_map_size != len(self.line_map):
+            return None
+        return "".join(self.result[start:]), self.new_line
+
+    def splice(self, value):
+        text, new_line = value
+        self.append(text)
+        self.new_line = new_line
+
+    def parenthesize(self, node, precedence):
+        """
+        Writes an opening parenthesis if `node`, an expression
+        of `precedence`, needs it in its context, and returns whether it did.
+        """
+        if self.precedences.get(node, PRECEDENCE_TEST) > precedence:
+            self.write('(')
+            return True
+        return False
+
+    # Places where `LineBreakingVisitor` can break the output;
+    # this visitor keeps everything on one line.
+
+    def open_bracket(self, text):
+        self.write(text)
+
+    def separator(self, text=', '):
+        self.write(text)
+
+    def close_bracket(self, text):
+        self.write(text)
 
     def newline(self, node=None):
         self.new_line = True
@@ -117,15 +425,15 @@ class SourceGeneratorNodeVisitor(ast.NodeVisitor):
         self.new_line = True
         self.indentation += 1
         for stmt in statements:
-            self.visit(stmt)
+            yield stmt
         self.indentation -= 1
 
     def body_or_else(self, node):
-        self.body(node.body)
+        yield self.body(node.body)
         if node.orelse:
             self.newline()
             self.write('else:')
-            self.body(node.orelse)
+            yield self.body(node.orelse)
 
     def signature(self, node):
         want_comma = []
@@ -138,10 +446,10 @@ class SourceGeneratorNodeVisitor(ast.NodeVisitor):
         padding = [None] * (len(node.args) - len(node.defaults))
         for arg, default in zip(node.args, padding + node.defaults):
             write_comma()
-            self.visit(arg)
+            yield arg
             if default is not None:
                 self.write('=')
-                self.visit(default)
+                yield default
         if node.vararg is not None:
             write_comma()
             if hasattr(ast, 'arg') and isinstance(node.vararg, ast.arg):
@@ -163,22 +471,24 @@ class SourceGeneratorNodeVisitor(ast.NodeVisitor):
         for decorator in node.decorator_list:
             self.newline(decorator)
             self.write('@')
-            self.visit(decorator)
+            yield decorator
 
     def visit_Assign(self, node):
         self.newline(node)
         for idx, target in enumerate(node.targets):
             if idx:
                 self.write(' = ')
-            self.visit(target)
+            yield target
         self.write(' = ')
-        self.visit(node.value)
+        self.precedences[node.value] = PRECEDENCE_YIELD
+        yield node.value
 
     def visit_AugAssign(self, node):
         self.newline(node)
-        self.visit(node.target)
+        yield node.target
         self.write(' ' + BINOP_SYMBOLS[type(node.op)] + '= ')
-        self.visit(node.value)
+        self.precedences[node.value] = PRECEDENCE_YIELD
+        yield node.value
 
     def visit_ImportFrom(self, node):
         self.newline(node)
@@ -197,19 +507,20 @@ class SourceGeneratorNodeVisitor(ast.NodeVisitor):
         for item in node.names:
             self.newline(node)
             self.write('import ')
-            self.visit(item)
+            yield item
 
     def visit_Expr(self, node):
         self.newline(node)
-        self.generic_visit(node)
+        self.precedences[node.value] = PRECEDENCE_YIELD
+        yield node.value
 
     def visit_FunctionDef(self, node):
-        self.decorators(node)
+        yield self.decorators(node)
         self.newline(node)
         self.write('def %s(' % node.name, node)
-        self.signature(node.args)
+        yield self.signature(node.args)
         self.write('):')
-        self.body(node.body)
+        yield self.body(node.body)
 
     def visit_ClassDef(self, node):
         have_args = [False]
@@ -220,64 +531,64 @@ class SourceGeneratorNodeVisitor(ast.NodeVisitor):
                 have_args[0] = True
                 self.write('(')
 
-        self.decorators(node)
+        yield self.decorators(node)
         self.newline(node)
         self.write('class %s' % node.name, node)
         for base in node.bases:
             paren_or_comma()
-            self.visit(base)
+            yield base
         if hasattr(node, 'keywords'):
             for keyword in node.keywords:
                 paren_or_comma()
-                self.write(keyword.arg + '=')
-                self.visit(keyword.value)
-            if node.starargs is not None:
+                self.write(keyword_prefix(keyword))
+                yield keyword.value
+            if getattr(node, 'starargs', None) is not None:
                 paren_or_comma()
                 self.write('*')
-                self.visit(node.starargs)
-            if node.kwargs is not None:
+                yield node.starargs
+            if getattr(node, 'kwargs', None) is not None:
                 paren_or_comma()
                 self.write('**')
-                self.visit(node.kwargs)
+                yield node.kwargs
         self.write('):' if have_args[0] else ':')
-        self.body(node.body)
+        yield self.body(node.body)
 
     def visit_If(self, node):
         self.newline(node)
         self.write('if ')
-        self.visit(node.test)
+        yield node.test
         self.write(':')
-        self.body(node.body)
+        yield self.body(node.body)
         while node.orelse:
             else_ = node.orelse
             if len(else_) == 1 and isinstance(else_[0], ast.If):
                 node = else_[0]
                 self.newline()
                 self.write('elif ')
-                self.visit(node.test)
+                yield node.test
                 self.write(':')
-                self.body(node.body)
+                yield self.body(node.body)
             else:
                 self.newline()
                 self.write('else:')
-                self.body(else_)
+                yield self.body(else_)
                 break
 
     def visit_For(self, node):
         self.newline(node)
         self.write('for ')
-        self.visit(node.target)
+        yield node.target
         self.write(' in ')
-        self.visit(node.iter)
+        yield node.iter
         self.write(':')
-        self.body_or_else(node)
+        yield self.body_or_else(node)
 
     def visit_While(self, node):
         self.newline(node)
         self.write('while ')
-        self.visit(node.test)
+        yield node.test
         self.write(':')
-        self.body_or_else(node)
+        yield self.body_or_else(node)
 
     def visit_Pass(self, node):
         self.newline(node)
@@ -288,7 +599,7 @@ class SourceGeneratorNodeVisitor(ast.NodeVisitor):
         self.write('del ')
 
         for target in node.targets:
-            self.visit(target)
+            yield target
             if target is not node.targets[-1]:
                 self.write(', ')
 
@@ -305,7 +616,7 @@ class SourceGeneratorNodeVisitor(ast.NodeVisitor):
         self.write('return')
         if node.value:
             self.write(' ')
-            self.visit(node.value)
+            yield node.value
 
     def visit_Break(self, node):
         self.newline(node)
@@ -316,35 +627,45 @@ class SourceGeneratorNodeVisitor(ast.NodeVisitor):
         self.write('continue')
 
     def visit_Attribute(self, node):
-        self.visit(node.value)
+        # `1.real` would be read as a float followed by a name
+        # (negative numbers are parenthesized anyway)
+        value = constant_value(node.value)
+        parens = type(value) is int and value >= 0
+        if parens:
+            self.write('(')
+        self.precedences[node.value] = PRECEDENCE_ATOM
+        yield node.value
+        if parens:
+            self.write(')')
         self.write('.' + node.attr)
 
     def visit_Call(self, node):
         want_comma = [False]
         def write_comma():
             if want_comma[0]:
-                self.write(', ')
+                self.separator()
             else:
                 want_comma[0] = True
 
-        self.visit(node.func)
-        self.write('(')
+        self.precedences[node.func] = PRECEDENCE_ATOM
+        yield node.func
+        self.open_bracket('(')
         for arg in node.args:
             write_comma()
-            self.visit(arg)
+            yield arg
         for keyword in node.keywords:
             write_comma()
-            self.write(keyword.arg + '=')
-            self.visit(keyword.value)
-        if node.starargs is not None:
+            self.write(keyword_prefix(keyword))
+            yield keyword.value
+        if getattr(node, 'starargs', None) is not None:
             write_comma()
             self.write('*')
-            self.visit(node.starargs)
-        if node.kwargs is not None:
+            yield node.starargs
+        if getattr(node, 'kwargs', None) is not None:
             write_comma()
             self.write('**')
-            self.visit(node.kwargs)
-        self.write(')')
+            yield node.kwargs
+        self.close_bracket(')')
 
     def visit_Name(self, node):
         self.write(node.id)
@@ -358,26 +679,53 @@ class SourceGeneratorNodeVisitor(ast.NodeVisitor):
     def visit_Bytes(self, node):
         self.write(repr(node.s))
 
+    def write_number(self, node, value):
+        text = repr(value)
+        # A negative number is written as a unary minus applied to it,
+        # which binds less tightly than powers, attributes and so on
+        context = self.precedences.get(node, PRECEDENCE_TEST)
+        if text.startswith('-') and context > PRECEDENCE_FACTOR:
+            text = '(' + text + ')'
+        self.write(text)
+
     def visit_Num(self, node):
-        self.write(repr(node.n))
+        self.write_number(node, node.n)
+
+    def visit_Constant(self, node):
+        # Py>=3.8 syntax: replaces Num, Str, Bytes, NameConstant and Ellipsis
+        if node.value is Ellipsis:
+            self.write('...')
+        else:
+            self.write_number(node, node.value)
+
+    def visit_NamedExpr(self, node):
+        # Py>=3.8 syntax; binds less tightly than anything else
+        parens = self.parenthesize(node, PRECEDENCE_TUPLE)
+        yield node.target
+        self.write(' := ')
+        yield node.value
+        if parens:
+            self.write(')')
 
     def visit_Tuple(self, node):
-        self.write('(')
+        self.open_bracket('(')
         idx = -1
         for idx, item in enumerate(node.elts):
             if idx:
-                self.write(', ')
-            self.visit(item)
-        self.write(idx and ')' or ',)')
+                self.separator()
+            yield item
+        if not idx:
+            self.write(',')
+        self.close_bracket(')')
 
     def sequence_visit(left, right):
         def visit(self, node):
-            self.write(left)
+            self.open_bracket(left)
             for idx, item in enumerate(node.elts):
                 if idx:
-                    self.write(', ')
-                self.visit(item)
-            self.write(right)
+                    self.separator()
+                yield item
+            self.close_bracket(right)
         return visit
 
     visit_List = sequence_visit('[', ']')
@@ -385,82 +733,138 @@ class SourceGeneratorNodeVisitor(ast.NodeVisitor):
     del sequence_visit
 
     def visit_Dict(self, node):
-        self.write('{')
+        self.open_bracket('{')
         for idx, (key, value) in enumerate(zip(node.keys, node.values)):
             if idx:
-                self.write(', ')
-            self.visit(key)
+                self.separator()
+            yield key
             self.write(': ')
-            self.visit(value)
-        self.write('}')
+            yield value
+        self.close_bracket('}')
 
     def visit_BinOp(self, node):
-        self.visit(node.left)
-        self.write(' %s ' % BINOP_SYMBOLS[type(node.op)])
-        self.visit(node.right)
+        precedences = self.precedences
+        precedence = BINOP_PRECEDENCE[type(node.op)]
+        parens = self.parenthesize(node, precedence)
+
+        if precedence == PRECEDENCE_POWER:
+            # Right-associative, and the exponent may be a unary operation
+            precedences[node.left] = PRECEDENCE_ATOM
+            yield node.left
+            self.write(' ** ')
+            precedences[node.right] = PRECEDENCE_FACTOR
+            yield node.right
+        else:
+            # Walk down a left-associative chain like `a + b - c + d`
+            # and write it in a loop, instead of visiting every operation
+            # separately; with wrappers installed, each node is visited.
+            left = node.left
+            if type(left) is ast.BinOp and not self.wrappers:
+                chain = [node]
+                while (type(left) is ast.BinOp
+                        and BINOP_PRECEDENCE[type(left.op)] == precedence):
+                    chain.append(left)
+                    left = left.left
+                chain.reverse()
+            else:
+                chain = (node,)
+            precedences[left] = precedence
+            yield left
+            right_precedence = precedence + 1
+            for operation in chain:
+                self.write(' %s ' % BINOP_SYMBOLS[type(operation.op)])
+                precedences[operation.right] = right_precedence
+                yield operation.right
+
+        if parens:
+            self.write(')')
 
     def visit_BoolOp(self, node):
-        self.write('(')
+        precedence = BOOLOP_PRECEDENCE[type(node.op)]
+        parens = self.parenthesize(node, precedence)
         for idx, value in enumerate(node.values):
             if idx:
                 self.write(' %s ' % BOOLOP_SYMBOLS[type(node.op)])
-            self.visit(value)
-        self.write(')')
+            # Nested operations of the same kind keep their parentheses
+            self.precedences[value] = precedence + 1
+            yield value
+        if parens:
+            self.write(')')
 
     def visit_Compare(self, node):
-        self.visit(node.left)
+        parens = self.parenthesize(node, PRECEDENCE_CMP)
+        self.precedences[node.left] = PRECEDENCE_CMP + 1
+        yield node.left
         for op, right in zip(node.ops, node.comparators):
             self.write(' %s ' % CMPOP_SYMBOLS[type(op)])
-            self.visit(right)
+            self.precedences[right] = PRECEDENCE_CMP + 1
+            yield right
+        if parens:
+            self.write(')')
 
     def visit_UnaryOp(self, node):
-        self.write('(')
         op = UNARYOP_SYMBOLS[type(node.op)]
-        self.write(op)
         if op == 'not':
-            self.write(' ')
-        self.visit(node.operand)
-        self.write(')')
+            precedence = PRECEDENCE_NOT
+            op += ' '
+        else:
+            precedence = PRECEDENCE_FACTOR
+        parens = self.parenthesize(node, precedence)
+        self.write(op)
+        self.precedences[node.operand] = precedence
+        yield node.operand
+        if parens:
+            self.write(')')
 
     def visit_Subscript(self, node):
-        self.visit(node.value)
+        self.precedences[node.value] = PRECEDENCE_ATOM
+        yield node.value
         self.write('[')
-        self.visit(node.slice)
+        yield node.slice
         self.write(']')
 
     def visit_Slice(self, node):
         if node.lower is not None:
-            self.visit(node.lower)
+            yield node.lower
         self.write(':')
         if node.upper is not None:
-            self.visit(node.upper)
+            yield node.upper
         if node.step is not None:
             self.write(':')
             if not (isinstance(node.step, ast.Name) and node.step.id == 'None'):
-                self.visit(node.step)
+                yield node.step
 
     def visit_ExtSlice(self, node):
         for idx, item in enumerate(node.dims):
             if idx:
                 self.write(', ')
-            self.visit(item)
+            yield item
 
     def visit_Yield(self, node):
+        parens = self.parenthesize(node, PRECEDENCE_YIELD)
         self.write('yield')
         if node.value:
             self.write(' ')
-            self.visit(node.value)
+            yield node.value
+        if parens:
+            self.write(')')
 
     def visit_YieldFrom(self, node):
         # Py>=3.3 syntax
+        parens = self.parenthesize(node, PRECEDENCE_YIELD)
         self.write('yield from ')
-        self.visit(node.value)
+        yield node.value
+        if parens:
+            self.write(')')
 
     def visit_Lambda(self, node):
+        parens = self.parenthesize(node, PRECEDENCE_TEST)
         self.write('lambda ')
-        self.signature(node.args)
+        yield self.signature(node.args)
         self.write(': ')
-        self.visit(node.body)
+        yield node.body
+        if parens:
+            self.write(')')
 
     def visit_Ellipsis(self, _):
         # Py>=3.0 syntax
@@ -468,11 +872,11 @@ class SourceGeneratorNodeVisitor(ast.NodeVisitor):
 
     def generator_visit(left, right):
         def visit(self, node):
-            self.write(left)
-            self.visit(node.elt)
+            self.open_bracket(left)
+            yield node.elt
             for comprehension in node.generators:
-                self.visit(comprehension)
-            self.write(right)
+                yield comprehension
+            self.close_bracket(right)
         return visit
 
     visit_ListComp = generator_visit('[', ']')
@@ -481,25 +885,31 @@ class SourceGeneratorNodeVisitor(ast.NodeVisitor):
     del generator_visit
 
     def visit_DictComp(self, node):
-        self.write('{')
-        self.visit(node.key)
+        self.open_bracket('{')
+        yield node.key
         self.write(': ')
-        self.visit(node.value)
+        yield node.value
         for comprehension in node.generators:
-            self.visit(comprehension)
-        self.write('}')
+            yield comprehension
+        self.close_bracket('}')
 
     def visit_IfExp(self, node):
-        self.visit(node.body)
+        parens = self.parenthesize(node, PRECEDENCE_TEST)
+        self.precedences[node.body] = PRECEDENCE_OR
+        yield node.body
         self.write(' if ')
-        self.visit(node.test)
+        self.precedences[node.test] = PRECEDENCE_OR
+        yield node.test
         self.write(' else ')
-        self.visit(node.orelse)
+        yield node.orelse
+        if parens:
+            self.write(')')
 
     def visit_Starred(self, node):
         # Py>=3 syntax
         self.write('*')
-        self.visit(node.value)
+        self.precedences[node.value] = PRECEDENCE_BOR
+        yield node.value
 
     def visit_alias(self, node):
         self.write(node.name)
@@ -507,14 +917,18 @@ class SourceGeneratorNodeVisitor(ast.NodeVisitor):
             self.write(' as ' + node.asname)
 
     def visit_comprehension(self, node):
-        self.write(' for ')
-        self.visit(node.target)
+        self.separator(' ')
+        self.write('for ')
+        yield node.target
         self.write(' in ')
-        self.visit(node.iter)
+        self.precedences[node.iter] = PRECEDENCE_OR
+        yield node.iter
         if node.ifs:
             for if_ in node.ifs:
-                self.write(' if ')
-                self.visit(if_)
+                self.separator(' ')
+                self.write('if ')
+                self.precedences[if_] = PRECEDENCE_OR
+                yield if_
 
     def visit_arg(self, node):
         # Py>=3 syntax
@@ -527,12 +941,12 @@ class SourceGeneratorNodeVisitor(ast.NodeVisitor):
         want_comma = False
         if node.dest is not None:
             self.write('>> ')
-            self.visit(node.dest)
+            yield node.dest
             want_comma = True
         for value in node.values:
             if want_comma:
                 self.write(', ')
-            self.visit(value)
+            yield value
             want_comma = True
         if not node.nl:
             self.write(',')
@@ -541,47 +955,47 @@ class SourceGeneratorNodeVisitor(ast.NodeVisitor):
         # Py2 syntax
         self.newline(node)
         self.write('try:')
-        self.body(node.body)
+        yield self.body(node.body)
         for handler in node.handlers:
-            self.visit(handler)
+            yield handler
 
     def visit_TryFinally(self, node):
         # Py2 syntax
         self.newline(node)
         self.write('try:')
-        self.body(node.body)
+        yield self.body(node.body)
         self.newline(node)
         self.write('finally:')
-        self.body(node.finalbody)
+        yield self.body(node.finalbody)
 
     def visit_Try(self, node):
         # Py>=3 syntax
         self.newline(node)
         self.write('try:')
-        self.body(node.body)
+        yield self.body(node.body)
         for handler in node.handlers:
-            self.visit(handler)
+            yield handler
         if node.finalbody:
             self.newline(node)
             self.write('finally:')
-            self.body(node.finalbody)
+            yield self.body(node.finalbody)
 
     def visit_ExceptHandler(self, node):
         self.newline(node)
         self.write('except')
         if node.type is not None:
             self.write(' ')
-            self.visit(node.type)
+            yield node.type
             if node.name is not None:
                 self.write(' as ')
                 if isinstance(node.name, ast.AST):
                     # In Py2, it's an ast.Name instance
-                    self.visit(node.name)
+                    yield node.name
                 else:
                     # In Py>=3, it's just a string
                     self.write(node.name)
         self.write(':')
-        self.body(node.body)
+        yield self.body(node.body)
 
     def visit_Raise(self, node):
         self.newline(node)
@@ -589,20 +1003,20 @@ class SourceGeneratorNodeVisitor(ast.NodeVisitor):
         if hasattr(node, 'exc') and node.exc is not None:
             # Py>=3 syntax
             self.write(' ')
-            self.visit(node.exc)
+            yield node.exc
             if node.cause is not None:
                 self.write(' from ')
-                self.visit(node.cause)
+                yield node.cause
         elif hasattr(node, 'type') and node.type is not None:
             # Py2 syntax
             self.write(' ')
-            self.visit(node.type)
+            yield node.type
             if node.inst is not None:
                 self.write(', ')
-                self.visit(node.inst)
+                yield node.inst
             if node.tback is not None:
                 self.write(', ')
-                self.visit(node.tback)
+                yield node.tback
 
     def visit_With(self, node):
         self.newline(node)
@@ -610,31 +1024,243 @@ class SourceGeneratorNodeVisitor(ast.NodeVisitor):
         if hasattr(node, 'items'):
             # Py>=3 syntax
             for with_item in node.items:
-                self.visit(with_item.context_expr)
+                yield with_item.context_expr
                 if with_item.optional_vars is not None:
                     self.write(' as ')
-                    self.visit(with_item.optional_vars)
+                    yield with_item.optional_vars
                 if with_item != node.items[-1]:
                     self.write(', ')
         elif hasattr(node, 'context_expr'):
             # Py2 syntax
-            self.visit(node.context_expr)
+            yield node.context_expr
             if node.optional_vars is not None:
                 self.write(' as ')
-                self.visit(node.optional_vars)
+                yield node.optional_vars
         self.write(':')
-        self.body(node.body)
+        yield self.body(node.body)
 
     def visit_Repr(self, node):
         # Py2 syntax
         self.write('`')
-        self.visit(node.value)
+        yield node.value
         self.write('`')
 
     def visit_Assert(self, node):
         self.newline(node)
         self.write('assert ')
-        self.visit(node.test)
+        yield node.test
         if node.msg:
             self.write(', ')
-            self.visit(node.msg)
+            yield node.msg
+
+
+# Kinds of the marks recorded by `LineBreakingVisitor`
+GROUP_BEGIN = 0
+GROUP_END = 1
+# A break inside a group, and the break before its closing bracket
+BREAK = 2
+CLOSING_BREAK = 3
+
+
+def break_line(text, marks, column, indent, indent_with, max_line_length):
+    """
+    Breaks a line of code that does not fit into `max_line_length` characters.
+
+    `text` is the line (or its end, starting at `column`), and `marks` is
+    a list of `(position, kind, blank)` in it: the beginnings and the ends
+    of bracketed groups, and the breaks inside them, each replacing
+    `blank` characters of `text` with a line break and the indentation.
+    Like in Oppen's pretty printing algorithm, a group is broken
+    (at all its breaks) if it does not fit together with the text following it
+    up to the next possible break; the groups are measured in one backward
+    pass, so the whole layout takes linear time.
+    The continuation lines of a broken group are indented by `indent_with`
+    relative to `indent`, the indentation of the enclosing group
+    (or of the statement).
+    """
+    # Pair the ends of the groups with their beginnings
+    ends = {}
+    begins = []
+    for i, (_, kind, _) in enumerate(marks):
+        if kind == GROUP_BEGIN:
+            begins.append(i)
+        elif kind == GROUP_END:
+            ends[i] = begins.pop()
+
+    # A group extends up to the first break after its end
+    sizes = {}
+    next_break = len(text)
+    for i in range(len(marks) - 1, -1, -1):
+        position, kind, _ = marks[i]
+        if kind >= BREAK:
+            next_break = position
+        elif kind == GROUP_END:
+            begin = ends[i]
+            sizes[begin] = next_break - marks[begin][0]
+
+    pieces = []
+    copied = 0
+    # Position in `text` where the current output line starts, and its column
+    line_start = 0
+    line_column = column
+    indents = [indent]
+    # Depth inside a group kept on one line
+    flat = 0
+    for i, (position, kind, blank) in enumerate(marks):
+        if kind == GROUP_BEGIN:
+            if flat:
+                flat += 1
+            elif (line_column + position - line_start
+                    + sizes.get(i, len(text) - position) > max_line_length):
+                indents.append(indents[-1] + indent_with)
+            else:
+                flat = 1
+        elif kind == GROUP_END:
+            if flat:
+                flat -= 1
+            else:
+                indents.pop()
+        elif not flat and len(indents) > 1:
+            new_indent = indents[-1] if kind == BREAK else indents[-2]
+            pieces.append(text[copied:position])
+            pieces.append("\n" + new_indent)
+            copied = line_start = position + blank
+            line_column = len(new_indent)
+    pieces.append(text[copied:])
+    return "".join(pieces)
+
+
+class LineBreakingVisitor(SourceGeneratorNodeVisitor):
+    """
+    Breaks lines longer than `max_line_length` characters inside
+    the brackets of calls, literals and comprehensions (see `break_line`).
+
+    Each line is rendered as usual, recording the places where it could
+    be broken, and laid out when it is complete, before the next statement
+    starts; so the running line count used for the line alignment
+    stays exact, and every line is processed only once.
+    """
+
+    def __init__(self, indent, max_line_length, sink=None,
+                 buffer_size=DEFAULT_BUFFER_SIZE, max_line_gap=None):
+        SourceGeneratorNodeVisitor.__init__(
+            self, indent, sink, buffer_size, max_line_gap)
+        self.max_line_length = max_line_length
+        # Marks of the current line (see `break_line`), with absolute offsets,
+        # and the number of marks in the completed lines
+        self.marks = []
+        self.marks_done = 0
+        # Where the tracked part of the current line starts:
+        # the index in `result`, the offset, the column and the indentation
+        self.line_start = None
+
+    def visit(self, node):
+        SourceGeneratorNodeVisitor.visit(self, node)
+        self.end_line()
+
+    def flush(self):
+        # The current line may still be changed
+        if not self.marks:
+            SourceGeneratorNodeVisitor.flush(self)
+
+    def add_mark(self, kind, blank=0):
+        if not self.marks:
+            self.line_start = (
+                len(self.result), self.offset, self.column, self.indent_string())
+        self.marks.append((self.offset, kind, blank))
+
+    def open_bracket(self, text):
+        self.add_mark(GROUP_BEGIN)
+        self.write(text)
+        self.add_mark(BREAK)
+
+    def separator(self, text=', '):
+        head = text.rstrip(' ')
+        if head:
+            self.write(head)
+        self.add_mark(BREAK, len(text) - len(head))
+        self.append(text[len(head):])
+
+    def close_bracket(self, text):
+        self.add_mark(CLOSING_BREAK)
+        self.write(text)
+        self.add_mark(GROUP_END)
+
+    def newline(self, node=None):
+        self.end_line()
+        SourceGeneratorNodeVisitor.newline(self, node)
+
+    def end_line(self):
+        marks = self.marks
+        if not marks:
+            return
+        self.marks = []
+        self.marks_done += len(marks)
+        if self.column <= self.max_line_length:
+            return
+
+        index, offset, column, indent = self.line_start
+        text = "".join(self.result[index:])
+        laid_out = break_line(
+            text, [(position - offset, kind, blank)
+                   for position, kind, blank in marks],
+            column, indent, self.indent_with, self.max_line_length)
+        self.result[index:] = [laid_out]
+
+        growth = len(laid_out) - len(text)
+        self.offset += growth
+        if self.sink is not None:
+            self.buffered += growth
+        newlines = laid_out.count('\n')
+        if newlines:
+            self.lines += newlines
+            self.column = len(laid_out) - laid_out.rindex('\n') - 1
+
+    # `RenderCache` support.
+    # Values keep the marks of the last line, which is laid out
+    # only after the value is recorded, and the indentation of that line.
+
+    def cache_key(self, node, digest):
+        if not isinstance(node, ast.expr):
+            # A statement starts, so the current line is complete
+            self.end_line()
+        return (SourceGeneratorNodeVisitor.cache_key(self, node, digest)
+                + (self.max_line_length,))
+
+    def mark(self):
+        return (SourceGeneratorNodeVisitor.mark(self)
+                + (self.marks_done + len(self.marks),))
+
+    def recorded(self, mark):
+        value = SourceGeneratorNodeVisitor.recorded(self, mark[:-1])
+        if value is None:
+            return None
+        first = max(mark[-1] - self.marks_done, 0)
+        marks = self.marks[first:]
+        if not marks:
+            return value + ((), None)
+        # Offsets relative to the end, which does not move
+        # until the line is laid out
+        end = self.offset
+        return value + (tuple(
+            (position - end, kind, blank) for position, kind, blank in marks),
+            self.line_start[3])
+
+    def splice(self, value):
+        text, new_line, marks, indent = value
+        if marks:
+            if not self.marks:
+                # The tracked part of the line starts after the last line break
+                line_end = text.rfind('\n') + 1
+                if line_end:
+                    self.append(text[:line_end])
+                    text = text[line_end:]
+                self.line_start = (
+                    len(self.result), self.offset, self.column, indent)
+            self.append(text)
+            end = self.offset
+            self.marks.extend(
+                (end + position, kind, blank) for position, kind, blank in marks)
+        else:
+            self.append(text)
+        self.new_line = new_line
@@ -0,0 +1,104 @@
+"""
+Differences between two trees, in the notation of `as_tree`.
+"""
+
+import ast
+import difflib
+
+from astprint.structure import fingerprint
+from astprint.tree import as_tree, sorted_fields
+
+
+# The value of a field missing from a node
+_MISSING = object()
+
+
+def tree_diff(a, b, indent="  ", width=None, memo=None):
+    """
+    Returns a string describing the differences between the trees `a` and `b`
+    (an empty string if they would give the same `as_tree()` output).
+
+    Each difference is a path from the root to the changed value
+    (e.g. `Module.body[2].value.id`) followed by the old value
+    and the new one, dumped with `as_tree(value, indent, width=width)`
+    (or `repr()` for non-node values) with each line prefixed by "- " or "+ ".
+    Items inserted into or removed from a list are given
+    as the slice they take in the old list (e.g. `Module.body[2:4]`,
+    or `Module.body[2:2]` for an insertion), with only the removed items
+    after "- " or only the inserted ones after "+ ".
+
+    Both trees are traversed together from the root, skipping the subtrees
+    with the same fingerprints (see `fingerprint`) at once,
+    so only the paths to the changes are visited and dumped.
+    The items of lists are matched by their fingerprints with `difflib`.
+
+    If `memo` is given, it is passed to `fingerprint`: when the same memo
+    is used for comparing the versions of a tree which share their unchanged
+    subtrees, only the new subtrees are hashed.
+    """
+    if memo is None:
+        memo = {}
+
+    def key(value):
+        if isinstance(value, ast.AST):
+            return fingerprint(value, memo)
+        if value is _MISSING:
+            return _MISSING
+        return type(value).__name__, repr(value)
+
+    def dump(value):
+        if isinstance(value, (ast.AST, list)):
+            return as_tree(value, indent, width=width)
+        return repr(value)
+
+    lines = []
+
+    def report(path, old, new):
+        lines.append(path + ":")
+        for value, prefix in ((old, "- "), (new, "+ ")):
+            if value is not _MISSING:
+                lines.extend(prefix + line for line in dump(value).split("\n"))
+
+    # `(path, old, new)`, or `(path, old, new, True)` for removed
+    # or inserted list items, which are reported as they are
+    stack = [(type(a).__name__, a, b)]
+    while stack:
+        change = stack.pop()
+        path, old, new = change[:3]
+        if len(change) == 4:
+            report(path, old, new)
+            continue
+
+        if isinstance(old, list) and isinstance(new, list):
+            changes = []
+            matcher = difflib.SequenceMatcher(
+                None, [key(item) for item in old], [key(item) for item in new],
+                autojunk=False)
+            for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+                if tag == 'equal':
+                    continue
+                # Changed items are paired, the rest were removed or inserted
+                paired = min(i2 - i1, j2 - j1)
+                changes.extend(
+                    (path + "[{0}]".format(i1 + k), old[i1 + k], new[j1 + k])
+                    for k in range(paired))
+                if i2 - i1 != j2 - j1:
+                    changes.append((
+                        path + "[{0}:{1}]".format(i1 + paired, i2),
+                        old[i1 + paired:i2] if i2 - i1 > paired else _MISSING,
+                        new[j1 + paired:j2] if j2 - j1 > paired else _MISSING,
+                        True))
+            stack.extend(reversed(changes))
+            continue
+
+        if key(old) == key(new):
+            continue
+        if isinstance(old, ast.AST) and type(old) is type(new):
+            stack.extend(
+                (path + "." + name,
+                 getattr(old, name, _MISSING), getattr(new, name, _MISSING))
+                for name, _ in reversed(sorted_fields(type(old))))
+        else:
+            report(path, old, new)
+
+    return "\n".join(lines)
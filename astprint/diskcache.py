@@ -0,0 +1,212 @@
+"""
+Persistent cache of whole render results.
+"""
+
+import ast
+import hashlib
+import os
+import tempfile
+
+import astprint
+from astprint.code import as_code, SourceGeneratorNodeVisitor
+from astprint.jsontree import as_json
+from astprint.structure import fingerprint
+from astprint.tree import as_tree, ASTPrinter
+
+
+RENDERERS = dict(code=as_code, tree=as_tree, json=as_json)
+
+# Node attributes which affect the output of each renderer
+DIGEST_ATTRIBUTES = dict(
+    code=SourceGeneratorNodeVisitor.digest_attributes,
+    tree=ASTPrinter.digest_attributes,
+    json=ASTPrinter.digest_attributes)
+
+# Rendering options which only affect the result, and can be a part of a key;
+# the others (`cache`, `source_map`, `stats`, `rope` and so on) are objects
+# filled during the rendering, or change the type of the result
+VALUE_OPTIONS = (
+    'indent', 'max_line_length', 'max_line_gap', 'width', 'specialized')
+
+
+def _hash(*parts):
+    digest = hashlib.blake2b(digest_size=20)
+    for part in parts:
+        if not isinstance(part, bytes):
+            part = part.encode('utf-8', 'surrogatepass')
+        digest.update(part)
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+class DiskCache(object):
+    """
+    A content-addressed cache of `as_code`, `as_tree` and `as_json` results
+    stored in `directory`, shared between processes and program runs.
+
+    An entry is identified by a hash of the input (the source text,
+    or the structure of the tree), the mode, the rendering options
+    and the version of the library, so a change in any of them
+    gives a new entry rather than a stale result.
+
+    Every entry is a separate file, written to a temporary file first
+    and then renamed, so concurrent readers and writers in different
+    processes never see partial results. When the total size of the entries
+    written by this object is estimated to exceed `max_bytes`,
+    the least recently used entries (by modification time, which is updated
+    on every hit) are removed until the cache takes at most
+    `cleanup_ratio * max_bytes`.
+    """
+
+    def __init__(self, directory, max_bytes=256 * 1024 * 1024, cleanup_ratio=0.9):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.cleanup_ratio = cleanup_ratio
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # Estimated size of the cache, found by scanning the directory
+        # on the first write
+        self._size = None
+        os.makedirs(directory, exist_ok=True)
+
+    def stats(self):
+        return dict(hits=self.hits, misses=self.misses, evictions=self.evictions)
+
+    def key(self, source, mode, options):
+        """
+        Returns the key of the result of rendering `source`
+        (a string or bytes with the source code, or a tree) in `mode`
+        (`'code'`, `'tree'` or `'json'`) with the keyword arguments `options`,
+        which can only be the ones listed in `VALUE_OPTIONS`.
+        """
+        for name in sorted(options):
+            if name not in VALUE_OPTIONS:
+                raise TypeError(
+                    "DiskCache does not support the option {0!r}".format(name))
+        if isinstance(source, ast.AST):
+            input_hash = "tree:" + fingerprint(
+                source, attributes=DIGEST_ATTRIBUTES[mode])
+        else:
+            input_hash = "source:" + _hash(source)
+        return _hash(
+            astprint.__version__, mode, repr(sorted(options.items())), input_hash)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key[2:])
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                text = f.read().decode('utf-8', 'surrogatepass')
+        except OSError:
+            self.misses += 1
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            # Removed by another process in the meantime
+            pass
+        self.hits += 1
+        return text
+
+    def put(self, key, text):
+        path = self._path(key)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        data = text.encode('utf-8', 'surrogatepass')
+
+        handle, temp_path = tempfile.mkstemp(dir=directory, prefix='.tmp')
+        try:
+            with os.fdopen(handle, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except BaseException:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
+
+        if self._size is None:
+            self._size = sum(size for _, size, _ in self._entries())
+        else:
+            self._size += len(data)
+        if self._size > self.max_bytes:
+            self.cleanup(int(self.max_bytes * self.cleanup_ratio))
+
+    def _entries(self):
+        """
+        Yields `(path, size, mtime)` of the entries.
+        """
+        try:
+            subdirectories = os.listdir(self.directory)
+        except OSError:
+            return
+        for subdirectory in subdirectories:
+            try:
+                files = os.scandir(os.path.join(self.directory, subdirectory))
+            except OSError:
+                continue
+            with files:
+                for entry in files:
+                    if entry.name.startswith('.tmp'):
+                        # Being written by another process
+                        continue
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    yield entry.path, stat.st_size, stat.st_mtime
+
+    def cleanup(self, max_bytes):
+        """
+        Removes the least recently used entries until the cache
+        takes at most `max_bytes`.
+        """
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        size = sum(entry_size for _, entry_size, _ in entries)
+        for path, entry_size, _ in entries:
+            if size <= max_bytes:
+                break
+            try:
+                os.remove(path)
+                self.evictions += 1
+            except OSError:
+                # Already removed by another process
+                pass
+            size -= entry_size
+        self._size = size
+
+    def clear(self):
+        self.cleanup(0)
+
+    def render(self, source, mode='code', **options):
+        """
+        Returns the result of rendering `source` (a string or bytes
+        with the source code, or a tree) in `mode` (`'code'` for `as_code`,
+        `'tree'` for `as_tree` or `'json'` for `as_json`) with `options`,
+        taking it from the cache if possible.
+        Only the options in `VALUE_OPTIONS` are supported, since
+        the other ones would not have any effect when the result is taken
+        from the cache; the rest raise `TypeError`.
+        The source code is only parsed if the result is not in the cache.
+
+        Note that a tree has to be read whole in order to find its structure,
+        which takes about as long as rendering it,
+        so passing the source code is much more effective.
+        """
+        key = self.key(source, mode, options)
+        text = self.get(key)
+        if text is None:
+            node = source if isinstance(source, ast.AST) else ast.parse(source)
+            text = RENDERERS[mode](node, **options)
+            self.put(key, text)
+        return text
+
+    def as_code(self, source, **options):
+        return self.render(source, 'code', **options)
+
+    def as_tree(self, source, **options):
+        return self.render(source, 'tree', **options)
@@ -0,0 +1,123 @@
+"""
+Incremental re-rendering of modified trees.
+"""
+
+import ast
+
+from astprint.code import SourceGeneratorNodeVisitor
+from astprint.structure import fingerprint
+
+
+class IncrementalCode(object):
+    """
+    The result of `as_code_incremental`.
+
+    `code` is the same string `as_code` would return;
+    `reused` and `rendered` are the numbers of statements which were copied
+    from the previous result and rendered anew, respectively
+    (nested statements of a reused statement are not counted).
+    """
+
+    def __init__(self, code, fragments, reused, rendered):
+        self.code = code
+        self.fragments = fragments
+        self.reused = reused
+        self.rendered = rendered
+
+    def __str__(self):
+        return self.code
+
+
+def as_code_incremental(node, previous=None, indent="    ", memo=None):
+    """
+    Renders `node` like `as_code(node, indent)` does, returning
+    an `IncrementalCode` object.
+
+    If `previous` (an `IncrementalCode` returned by an earlier call) is given,
+    statements (at any nesting level) which are structurally identical
+    to the ones rendered in that call, and start at the same output line
+    and indentation level, are copied from it instead of being visited again.
+    So, after a transformation touching a few statements of a large module,
+    only those statements (and the statements containing them) are rendered,
+    and the line alignment of the result is the same as `as_code` would give.
+
+    The statements are compared by their digests (see `fingerprint`),
+    and hashing the whole tree takes longer than rendering it.
+    If `memo` (a dictionary, or a `weakref.WeakKeyDictionary`) is given,
+    the digests are kept in it, so that only the nodes which were not
+    in the trees rendered with it before are hashed. The nodes must not be
+    changed in place then: a changed node has to be replaced with a new one,
+    and so do the nodes containing it. The memo must not be shared with
+    `fingerprint` or `tree_diff`, as the digests here include line numbers.
+    """
+    fragments = _Fragments(previous.fragments if previous is not None else {})
+    visitor = SourceGeneratorNodeVisitor(indent)
+    visitor.wrappers.append(fragments.wrapper(visitor, node, memo))
+    visitor.visit(node)
+    return IncrementalCode(
+        visitor.dumps().strip("\n"), fragments.current,
+        fragments.reused, fragments.rendered)
+
+
+class _Fragments(object):
+    """
+    Keeps the rendered statements of the previous and the current render.
+    Each fragment is stored as `(text, new_line, nested_keys)`, where
+    `nested_keys` lists the keys of the statements directly inside it,
+    so that when a statement is reused, its nested fragments
+    can be carried over to the current render as well.
+    """
+
+    def __init__(self, previous):
+        self.previous = previous
+        self.current = {}
+        self.nested_keys = [[]]
+        self.reused = 0
+        self.rendered = 0
+
+    def wrapper(self, visitor, root, digests=None):
+        if digests is None:
+            digests = {}
+        fingerprint(root, digests, visitor.digest_attributes)
+
+        def wrap(node_class, method):
+            if not issubclass(node_class, ast.stmt):
+                return method
+
+            def visit(visitor, node):
+                digest = digests.get(node)
+                if digest is None:
+                    return method(visitor, node)
+
+                key = visitor.cache_key(node, digest[0])
+                self.nested_keys[-1].append(key)
+                fragment = self.previous.get(key)
+                if fragment is not None:
+                    self.reuse(key)
+                    visitor.splice(fragment[:2])
+                    return None
+
+                self.rendered += 1
+                self.nested_keys.append([])
+                mark = visitor.mark()
+                return self._record(visitor, key, mark, method(visitor, node))
+
+            return visit
+
+        return wrap
+
+    def reuse(self, key):
+        self.reused += 1
+        keys = [key]
+        while keys:
+            key = keys.pop()
+            fragment = self.previous[key]
+            self.current[key] = fragment
+            keys.extend(fragment[2])
+
+    def _record(self, visitor, key, mark, gen):
+        if gen is not None:
+            yield gen
+        nested_keys = self.nested_keys.pop()
+        text, new_line = visitor.recorded(mark)
+        self.current[key] = (text, new_line, tuple(nested_keys))
@@ -0,0 +1,157 @@
+"""
+Export of node trees as JSON.
+"""
+
+import ast
+import json
+import math
+
+from astprint.tree import ASTPrinter, sorted_fields
+
+
+DEFAULT_BUFFER_SIZE = 64 * 1024
+
+_encode_string = json.encoder.encode_basestring_ascii
+
+
+def as_json(node):
+    """
+    Returns a JSON string representing a node tree.
+
+    Each node is represented by an object with the class name
+    in the `"_type"` member and the fields of the node in the other members
+    (in the same order `as_tree` uses). Literals which have no JSON equivalent
+    are represented by objects with the `"_literal"` member:
+
+    * bytes: `{"_literal": "bytes", "value": <bytes decoded as latin-1>}`;
+    * complex numbers: `{"_literal": "complex", "value": [<real>, <imag>]}`;
+    * non-finite floats: `{"_literal": "float", "value": "inf"/"-inf"/"nan"}`;
+    * the `Ellipsis` constant: `{"_literal": "Ellipsis"}`.
+    """
+    visitor = JSONPrinter()
+    visitor.visit(node)
+    return visitor.dumps()
+
+
+def write_json(node, fp, buffer_size=DEFAULT_BUFFER_SIZE):
+    """
+    Writes the same text as `as_json(node)` to a file-like object `fp`,
+    calling `fp.write()` every time roughly `buffer_size` characters
+    have been accumulated.
+    """
+    visitor = JSONPrinter(sink=fp, buffer_size=buffer_size)
+    visitor.visit(node)
+    visitor.flush()
+
+
+def write_ndjson(node, fp, buffer_size=DEFAULT_BUFFER_SIZE):
+    """
+    Writes the elements of `node.body` (e.g. the statements of a module)
+    to a file-like object `fp` as newline-delimited JSON:
+    `as_json(stmt)` of each statement followed by a line break.
+    """
+    visitor = JSONPrinter(sink=fp, buffer_size=buffer_size)
+    for stmt in node.body:
+        visitor.visit(stmt)
+        visitor.write("\n")
+    visitor.flush()
+
+
+def _literal(value):
+    value_type = type(value)
+    if value_type is str:
+        return _encode_string(value)
+    elif value is None:
+        return "null"
+    elif value_type is bool:
+        return "true" if value else "false"
+    elif value_type is int:
+        return repr(value)
+    elif value_type is float:
+        if math.isinf(value) or math.isnan(value):
+            return '{"_literal":"float","value":"' + repr(value) + '"}'
+        return repr(value)
+    elif value_type is bytes:
+        return '{"_literal":"bytes","value":' + _encode_string(value.decode('latin-1')) + '}'
+    elif value_type is complex:
+        return ('{"_literal":"complex","value":['
+            + _literal(value.real) + ',' + _literal(value.imag) + ']}')
+    elif value is Ellipsis:
+        return '{"_literal":"Ellipsis"}'
+    else:
+        raise TypeError("Cannot represent {0!r} in JSON".format(value))
+
+
+_node_templates = {}
+
+
+def _node_template(node_class):
+    """
+    Returns the beginning of the JSON object for a node of `node_class`,
+    and a list of `(name, prefix)` for its fields.
+    """
+    try:
+        return _node_templates[node_class]
+    except KeyError:
+        start = '{"_type":' + _encode_string(node_class.__name__)
+        fields = [
+            (name, ',' + _encode_string(name) + ':')
+            for name, _ in sorted_fields(node_class)]
+        _node_templates[node_class] = start, fields
+        return start, fields
+
+
+class JSONPrinter(ASTPrinter):
+    """
+    Uses the same traversal as `ASTPrinter` to produce the JSON representation
+    of the tree (see `as_json`).
+    """
+
+    def __init__(self, sink=None, buffer_size=DEFAULT_BUFFER_SIZE):
+        ASTPrinter.__init__(self, "")
+        self.sink = sink
+        self.buffer_size = buffer_size
+        self.buffered = 0
+
+    def write(self, text):
+        self.result.append(text)
+        if self.sink is not None:
+            self.buffered += len(text)
+            if self.buffered >= self.buffer_size:
+                self.flush()
+
+    def flush(self):
+        if self.sink is not None and self.result:
+            self.sink.write("".join(self.result))
+            del self.result[:]
+            self.buffered = 0
+
+    def generic_visit(self, node):
+        if isinstance(node, list):
+            self.write("[")
+            for i, child in enumerate(node):
+                if i:
+                    self.write(",")
+                if isinstance(child, (ast.AST, list)):
+                    yield child
+                else:
+                    self.write(_literal(child))
+            self.write("]")
+            return
+
+        start, fields = _node_template(node.__class__)
+        self.write(start)
+        for name, prefix in fields:
+            try:
+                value = getattr(node, name)
+            except AttributeError:
+                # Same as `ast.iter_fields()`, skip missing fields
+                continue
+            if isinstance(value, (ast.AST, list)):
+                self.write(prefix)
+                yield value
+            else:
+                self.write(prefix + _literal(value))
+        self.write("}")
+
+    visit_Constant = generic_visit
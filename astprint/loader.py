@@ -0,0 +1,130 @@
+"""
+Loading of `as_tree` output without `eval()`.
+"""
+
+import ast
+import re
+
+
+# Either a valid token in the first group, or an unexpected character
+# in the second one.
+_TOKENS = re.compile(r"""
+    \s*(?:(
+        [A-Za-z_]\w*[(=]
+        | [bBuU]?[rR]?(?:'(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*")
+        | \([^()]*j\)
+        | -?(?:(?:\d[\d_]*\.?[\d_]*|\.\d[\d_]*)(?:[eE][+-]?\d+)?j?|infj?|nanj?)
+        | (?:None|True|False|Ellipsis)\b
+        | [\[\]),]
+    )|(\S))""", re.VERBOSE)
+
+_CONSTANTS = {'None': None, 'True': True, 'False': False, 'Ellipsis': Ellipsis}
+
+
+def _number(text):
+    if text.endswith("j"):
+        return complex(text)
+    elif text.isdigit() or (text[0] == "-" and text[1:].isdigit()):
+        return int(text)
+    else:
+        return float(text)
+
+
+class _NodeFrame(object):
+
+    __slots__ = ('node_class', 'fields', 'field')
+
+    def __init__(self, node_class):
+        self.node_class = node_class
+        self.fields = {}
+        self.field = None
+
+
+def load_tree(source):
+    """
+    Rebuilds the tree from the output of `as_tree` (or of `ast.dump()`).
+
+    `source` is either a string, or a file-like object, which is read
+    line by line. The input is parsed in a single pass without recursion,
+    and only node classes from the `ast` module are created,
+    so, unlike `eval()`, it is safe to use on untrusted input.
+    Raises `ValueError` if the input is not a valid tree dump.
+    """
+    if isinstance(source, str):
+        lines = [source]
+    else:
+        lines = source
+
+    # Each frame is either a `_NodeFrame` for a node being read,
+    # or a list (for a list being read).
+    stack = []
+    result = []
+    find_tokens = _TOKENS.findall
+
+    for line_number, line in enumerate(lines):
+        for token, unexpected in find_tokens(line):
+            if unexpected:
+                raise ValueError("Unexpected input at line {0}: {1!r}".format(
+                    line_number + 1, unexpected))
+
+            # Tokens are told apart by their last character
+            last = token[-1]
+            if last == "(":
+                name = token[:-1]
+                node_class = getattr(ast, name, None)
+                if not (isinstance(node_class, type) and issubclass(node_class, ast.AST)):
+                    raise ValueError("Unknown node class {0!r} at line {1}".format(
+                        name, line_number + 1))
+                stack.append(_NodeFrame(node_class))
+                continue
+            elif last == "=":
+                if not stack or type(stack[-1]) is list:
+                    raise ValueError("Unexpected field name at line {0}".format(
+                        line_number + 1))
+                stack[-1].field = token[:-1]
+                continue
+            elif last == ",":
+                continue
+            elif last == "[":
+                stack.append([])
+                continue
+            elif token == ")":
+                if not stack or type(stack[-1]) is list:
+                    raise ValueError("Unbalanced brackets at line {0}".format(
+                        line_number + 1))
+                frame = stack.pop()
+                value = frame.node_class(**frame.fields)
+            elif token == "]":
+                if not stack or type(stack[-1]) is not list:
+                    raise ValueError("Unbalanced brackets at line {0}".format(
+                        line_number + 1))
+                value = stack.pop()
+            elif last == "'" or last == '"':
+                if token[0] == last and "\\" not in token:
+                    # A plain string without escapes, the most common case
+                    value = token[1:-1]
+                else:
+                    value = ast.literal_eval(token)
+            elif last == ")":
+                value = complex(token[1:-1])
+            elif token in _CONSTANTS:
+                value = _CONSTANTS[token]
+            else:
+                value = _number(token.replace("_", ""))
+
+            if not stack:
+                result.append(value)
+            elif type(stack[-1]) is list:
+                stack[-1].append(value)
+            else:
+                frame = stack[-1]
+                if frame.field is None:
+                    raise ValueError(
+                        "Positional values are not supported (line {0})".format(
+                            line_number + 1))
+                frame.fields[frame.field] = value
+                frame.field = None
+
+    if stack or len(result) != 1:
+        raise ValueError("Incomplete or excessive input")
+    return result[0]
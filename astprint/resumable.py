@@ -0,0 +1,132 @@
+"""
+Rendering in steps limited by a budget.
+"""
+
+import time
+
+from astprint.code import SourceGeneratorNodeVisitor, _NewlineStripper
+from astprint.tree import ASTPrinter
+from astprint.walker import iter_walk
+
+
+class RenderCancelled(Exception):
+    """
+    Raised by `ResumableRenderer.run()` after the rendering was cancelled.
+    """
+
+
+class ResumableRenderer(object):
+    """
+    Renders `node` as `as_code` (`mode='code'`) or `as_tree` (`mode='tree'`)
+    would, in steps: each call of `run()` continues the traversal
+    from where the previous one stopped, and returns the text produced
+    in the meantime. The concatenation of all the returned pieces
+    is the same as the result of `as_code(node, indent)`
+    or `as_tree(node, indent)`.
+
+    Between the calls, only the traversal stack and the visitor state
+    are kept, so the rendering of a huge tree can be spread over time,
+    or abandoned with `cancel()`.
+    """
+
+    def __init__(self, node, mode='code', indent=None):
+        self._pieces = []
+        if mode == 'code':
+            self._visitor = SourceGeneratorNodeVisitor(
+                "    " if indent is None else indent)
+            # Drops the leading and the trailing newlines, like `as_code` does
+            self._output = _NewlineStripper(self)
+        elif mode == 'tree':
+            self._visitor = ASTPrinter("  " if indent is None else indent)
+            self._output = self
+        else:
+            raise ValueError("Unknown mode: {0!r}".format(mode))
+        self.mode = mode
+        self._steps = iter_walk(self._visitor, node)
+        self.done = False
+        self.cancelled = False
+        # Totals over all the calls of `run()`
+        self.nodes = 0
+        self.characters = 0
+
+    def write(self, text):
+        self._pieces.append(text)
+
+    def run(self, max_nodes=None, max_characters=None, max_seconds=None):
+        """
+        Continues the rendering until it is finished, or until one of
+        the given budgets for this call is exhausted: `max_nodes` visited
+        nodes, `max_characters` characters of output or `max_seconds`
+        seconds (the budgets are checked after each node, so the last one
+        may overshoot the character and time limits slightly).
+
+        Returns the text produced during the call
+        (an empty string once the rendering is done).
+        Raises `RenderCancelled` if `cancel()` has been called.
+        """
+        if self.cancelled:
+            raise RenderCancelled("The rendering was cancelled")
+        if self.done:
+            return ""
+
+        visitor = self._visitor
+        result = visitor.result
+        if max_seconds is not None:
+            deadline = time.perf_counter() + max_seconds
+        nodes = 0
+        characters = 0
+        counted = len(result)
+
+        for _ in self._steps:
+            nodes += 1
+            if self.cancelled:
+                # Set by another thread
+                break
+            if max_nodes is not None and nodes >= max_nodes:
+                break
+            if max_characters is not None:
+                for text in result[counted:]:
+                    characters += len(text)
+                counted = len(result)
+                if characters >= max_characters:
+                    break
+            if max_seconds is not None and time.perf_counter() >= deadline:
+                break
+        else:
+            self.done = True
+
+        self.nodes += nodes
+        if self.cancelled:
+            self._release()
+            raise RenderCancelled("The rendering was cancelled")
+        return self._take_output()
+
+    def _take_output(self):
+        result = self._visitor.result
+        self._output.write("".join(result))
+        del result[:]
+        text = "".join(self._pieces)
+        del self._pieces[:]
+        self.characters += len(text)
+        return text
+
+    def cancel(self):
+        """
+        Stops the rendering and releases the traversal state.
+        Can be called from another thread while `run()` is in progress,
+        in which case `run()` raises `RenderCancelled` after the current node.
+        """
+        self.cancelled = True
+        if not self.done:
+            try:
+                self._release()
+            except ValueError:
+                # The traversal is running in another thread;
+                # `run()` will release it
+                pass
+
+    def _release(self):
+        self._steps.close()
+        self._pieces = []
+        self._visitor.result = []
+        self.done = True
@@ -0,0 +1,127 @@
+"""
+Rendered text kept as the list of pieces it was produced in.
+"""
+
+import array
+import bisect
+
+
+class Rope(object):
+    """
+    The output of `as_code` or `as_tree` (when called with `rope=True`)
+    as the list of strings it was rendered in, which is never copied
+    unless the text is explicitly asked for with `str()`.
+
+    `len()` and the lines (see `lines()`) are found without building the text;
+    the first call of `lines()` indexes the line breaks of all the pieces.
+    `writelines()` passes the pieces to a file as they are,
+    and `encode()` yields them as large blocks of bytes,
+    suitable for `socket.sendall()`.
+    """
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self._length = None
+        # Number of line breaks before each chunk, and in all of them
+        self._line_breaks = None
+
+    def __len__(self):
+        if self._length is None:
+            self._length = sum(len(chunk) for chunk in self.chunks)
+        return self._length
+
+    def __str__(self):
+        return "".join(self.chunks)
+
+    def __iter__(self):
+        return iter(self.chunks)
+
+    def __repr__(self):
+        return "<Rope of {0} characters in {1} chunks>".format(
+            len(self), len(self.chunks))
+
+    def strip_newlines(self):
+        """
+        Removes the leading and the trailing newlines, like `str.strip("\\n")`,
+        copying only the first and the last non-empty pieces.
+        Returns the number of the removed leading newlines.
+        """
+        chunks = self.chunks
+        start = 0
+        leading = 0
+        while start < len(chunks):
+            stripped = chunks[start].lstrip("\n")
+            leading += len(chunks[start]) - len(stripped)
+            if stripped:
+                chunks[start] = stripped
+                break
+            start += 1
+        del chunks[:start]
+
+        end = len(chunks)
+        while end:
+            stripped = chunks[end - 1].rstrip("\n")
+            if stripped:
+                chunks[end - 1] = stripped
+                break
+            end -= 1
+        del chunks[end:]
+
+        self._length = None
+        self._line_breaks = None
+        return leading
+
+    def writelines(self, fp):
+        """
+        Writes the text to a file-like object `fp`.
+        """
+        fp.writelines(self.chunks)
+
+    def encode(self, encoding='utf-8', errors='strict', block_size=65536):
+        """
+        Yields the encoded text in blocks of about `block_size` characters.
+        """
+        block = []
+        size = 0
+        for chunk in self.chunks:
+            block.append(chunk)
+            size += len(chunk)
+            if size >= block_size:
+                yield "".join(block).encode(encoding, errors)
+                block = []
+                size = 0
+        if block:
+            yield "".join(block).encode(encoding, errors)
+
+    def line_count(self):
+        """
+        Returns the number of lines (the same as `len(text.split("\\n"))`).
+        """
+        return self._index()[-1] + 1
+
+    def lines(self, start=0, stop=None):
+        """
+        Returns the same list as `str(self).split("\\n")[start:stop]`,
+        joining only the pieces the lines are in.
+        """
+        line_breaks = self._index()
+        start, stop, _ = slice(start, stop).indices(line_breaks[-1] + 1)
+        if start >= stop:
+            return []
+        # The pieces containing the line break before the first line,
+        # and the one after the last line
+        first = max(bisect.bisect_left(line_breaks, start) - 1, 0)
+        last = bisect.bisect_left(line_breaks, stop)
+        lines = "".join(self.chunks[first:last]).split("\n")
+        skipped = line_breaks[first]
+        return lines[start - skipped:stop - skipped]
+
+    def _index(self):
+        if self._line_breaks is None:
+            line_breaks = array.array('l', [0])
+            total = 0
+            for chunk in self.chunks:
+                total += chunk.count("\n")
+                line_breaks.append(total)
+            self._line_breaks = line_breaks
+        return self._line_breaks
@@ -0,0 +1,166 @@
+"""
+Mapping between the output of `as_code` and the nodes it was generated from.
+"""
+
+import array
+import bisect
+
+
+class SourceMap(object):
+    """
+    The positions of nodes in the output of `as_code`,
+    filled when passed to it as the `source_map` argument.
+
+    Positions are recorded for every node the renderer visits
+    (statements, expressions and some auxiliary nodes like `arguments`,
+    but not, for example, operators or expression contexts).
+    A node taken from a `RenderCache` is recorded as a whole,
+    without the nodes inside it.
+
+    The data is kept in flat arrays: `nodes[i]` spans the output characters
+    from `starts[i]` to `ends[i]` (exclusive); nodes are stored in the order
+    they were visited.
+
+    Passing the same object to another `as_code` call replaces
+    its contents with the map of the new output.
+    """
+
+    def __init__(self):
+        self._reset()
+
+    def _reset(self):
+        self.nodes = []
+        self.starts = array.array('q')
+        self.ends = array.array('q')
+        self.line_starts = array.array('q')
+        # Output offsets at which the innermost node changes,
+        # and the indices of these nodes (-1 for none)
+        self.segment_starts = array.array('q')
+        self.segment_nodes = array.array('q')
+        self._indices = None
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def wrapper(self, visitor):
+        """
+        Returns a dispatch table wrapper (see `WalkingVisitor.wrappers`)
+        recording the nodes visited by `visitor`.
+        The previously recorded nodes are discarded.
+        """
+        self._reset()
+
+        def wrap(node_class, method):
+            def visit(visitor, node):
+                index = len(self.nodes)
+                self.nodes.append(node)
+                self.starts.append(0)
+                self.ends.append(0)
+                mark = len(visitor.result), visitor.offset
+                gen = method(visitor, node)
+                if gen is None:
+                    self._close(visitor, index, mark)
+                    return None
+                return self._track(visitor, index, mark, gen)
+            return visit
+
+        return wrap
+
+    def _track(self, visitor, index, mark, gen):
+        yield gen
+        self._close(visitor, index, mark)
+
+    def _close(self, visitor, index, mark):
+        # Statements start with the line break and the indentation;
+        # the span of the node begins at its first non-whitespace character.
+        result = visitor.result
+        fragment_index, start = mark
+        for fragment_index in range(fragment_index, len(result)):
+            fragment = result[fragment_index]
+            stripped = fragment.lstrip()
+            start += len(fragment) - len(stripped)
+            if stripped:
+                break
+        self.starts[index] = start
+        self.ends[index] = visitor.offset
+
+    def finish(self, code, shift):
+        """
+        Finalizes the map for the output `code`, which had `shift` characters
+        removed from the beginning compared to the rendered text.
+        """
+        length = len(code)
+        for i in range(len(self.nodes)):
+            self.starts[i] = min(max(self.starts[i] - shift, 0), length)
+            self.ends[i] = min(max(self.ends[i] - shift, 0), length)
+
+        self.line_starts.append(0)
+        position = code.find("\n")
+        while position != -1:
+            self.line_starts.append(position + 1)
+            position = code.find("\n", position + 1)
+
+        # Nodes are stored in pre-order, so their starts are non-decreasing,
+        # and the innermost node for each offset can be found in one sweep.
+        segment_starts = self.segment_starts
+        segment_nodes = self.segment_nodes
+
+        def add_segment(start, node_index):
+            if segment_starts and segment_starts[-1] == start:
+                segment_nodes[-1] = node_index
+            else:
+                segment_starts.append(start)
+                segment_nodes.append(node_index)
+
+        add_segment(0, -1)
+        stack = []
+        for i in range(len(self.nodes)):
+            start = self.starts[i]
+            while stack and self.ends[stack[-1]] <= start:
+                closed = stack.pop()
+                add_segment(self.ends[closed], stack[-1] if stack else -1)
+            add_segment(start, i)
+            stack.append(i)
+        while stack:
+            closed = stack.pop()
+            add_segment(self.ends[closed], stack[-1] if stack else -1)
+
+    def node_at(self, offset):
+        """
+        Returns the innermost node containing the character at `offset`
+        of the output, or `None` if there is no such node.
+        """
+        index = bisect.bisect_right(self.segment_starts, offset) - 1
+        if index < 0:
+            return None
+        node_index = self.segment_nodes[index]
+        return None if node_index == -1 else self.nodes[node_index]
+
+    def node_at_position(self, line, column):
+        """
+        Same as `node_at`, but takes a line number (starting from 1,
+        as `lineno` of nodes does) and a column (starting from 0).
+        """
+        return self.node_at(self.line_starts[line - 1] + column)
+
+    def position(self, offset):
+        """
+        Returns the `(line, column)` pair for an offset in the output.
+        """
+        line = bisect.bisect_right(self.line_starts, offset)
+        return line, offset - self.line_starts[line - 1]
+
+    def span(self, node):
+        """
+        Returns `(start_line, start_column, end_line, end_column)` of `node`
+        in the output (the end is exclusive),
+        or `None` if the node was not recorded.
+        """
+        if self._indices is None:
+            self._indices = dict(
+                (id(mapped), i) for i, mapped in enumerate(self.nodes))
+        index = self._indices.get(id(node))
+        if index is None:
+            return None
+        return (self.position(self.starts[index])
+            + self.position(self.ends[index]))
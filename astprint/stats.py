@@ -0,0 +1,86 @@
+"""
+Optional instrumentation of the printers.
+"""
+
+import collections
+import time
+
+from astprint.walker import dispatch_table
+
+
+class RenderStats(object):
+    """
+    Statistics of a rendering, filled when passed as the `stats` argument
+    to `as_code` or `as_tree` (accumulated, if the same object is passed
+    to several calls).
+
+    `nodes` maps node class names to the number of visited nodes,
+    `times` maps visiting method names (`visit_Name`, `generic_visit` etc.)
+    to the total time spent in them, in seconds (excluding the time
+    spent visiting the child nodes), `calls` maps them to the number
+    of calls, `characters` is the number of characters emitted,
+    and `max_depth` is the maximum nesting depth of visited nodes.
+    """
+
+    def __init__(self):
+        self.nodes = collections.Counter()
+        self.times = collections.defaultdict(float)
+        self.calls = collections.Counter()
+        self.characters = 0
+        self.max_depth = 0
+        # Time spent in the children of each node currently being visited
+        self._child_times = [0.0]
+
+    def wrapper(self, visitor):
+        """
+        Returns a dispatch table wrapper (see `WalkingVisitor.wrappers`)
+        collecting the statistics for `visitor`.
+        """
+        base_table = dispatch_table(type(visitor))
+
+        def wrap(node_class, method):
+            node_name = node_class.__name__
+            method_name = base_table[node_class].__name__
+
+            def visit(visitor, node):
+                self.nodes[node_name] += 1
+                self.calls[method_name] += 1
+                self._child_times.append(0.0)
+                if len(self._child_times) - 1 > self.max_depth:
+                    self.max_depth = len(self._child_times) - 1
+                start = time.perf_counter()
+                gen = method(visitor, node)
+                if gen is None:
+                    self._finish(method_name, start)
+                    return None
+                return self._track(method_name, start, gen)
+
+            return visit
+
+        return wrap
+
+    def _track(self, method_name, start, gen):
+        yield gen
+        self._finish(method_name, start)
+
+    def _finish(self, method_name, start):
+        elapsed = time.perf_counter() - start
+        child_time = self._child_times.pop()
+        self.times[method_name] += elapsed - child_time
+        self._child_times[-1] += elapsed
+
+    def total_time(self):
+        return sum(self.times.values())
+
+    def report(self, limit=None):
+        """
+        Returns a table of the visiting methods sorted by the time spent in them.
+        """
+        lines = ["{0:<24} {1:>10} {2:>12}".format("method", "calls", "seconds")]
+        methods = sorted(self.times, key=lambda name: -self.times[name])
+        for name in methods[:limit]:
+            lines.append("{0:<24} {1:>10} {2:>12.6f}".format(
+                name, self.calls[name], self.times[name]))
+        lines.append("nodes: {0}, characters: {1}, max depth: {2}".format(
+            sum(self.nodes.values()), self.characters, self.max_depth))
+        return "\n".join(lines)
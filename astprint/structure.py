@@ -0,0 +1,104 @@
+"""
+Structural hashing of AST subtrees.
+"""
+
+import ast
+import hashlib
+
+from astprint.tree import sorted_fields
+
+
+def _digest(text):
+    return hashlib.blake2b(
+        text.encode('utf-8', 'surrogatepass'), digest_size=16).hexdigest()
+
+
+def subtree_digests(node, attributes=()):
+    """
+    Returns a dictionary mapping `id()` of every AST node in the tree of `node`
+    to a tuple `(digest, size)`, where `digest` is a hex string identifying
+    the structure of the subtree (the same for all subtrees that would give
+    the same `as_tree()` output), and `size` is the number of nodes in it.
+
+    The values of `attributes` (e.g. `('lineno',)`) are included in the digest
+    of every node that has them.
+    The tree is processed bottom-up, without recursion.
+    """
+    digests = {}
+    _fill_digests(node, attributes, digests, id)
+    return digests
+
+
+def fingerprint(node, memo=None, attributes=()):
+    """
+    Returns the digest of the subtree of `node` (see `subtree_digests`):
+    a Merkle hash, combining the class of each node with its fields
+    in the order of `as_tree()` and the digests of its children.
+
+    If `memo` (a dictionary, or a `weakref.WeakKeyDictionary`) is given,
+    the digests of `node` and all its descendants are kept in it,
+    and the subtrees found in it are not traversed again,
+    so a repeated call for any of them takes constant time.
+    The trees must not be changed while a memo is used for them,
+    and it must always be used with the same `attributes`.
+    """
+    if memo is None:
+        memo = {}
+    _fill_digests(node, attributes, memo, _same)
+    return memo[node][0]
+
+
+def _same(node):
+    return node
+
+
+def _fill_digests(node, attributes, digests, key):
+    """
+    Adds `(digest, size)` of every subtree of `node` missing from `digests`
+    to it, under `key(subtree)`.
+    """
+    stack = [(node, False)]
+    while stack:
+        current, children_done = stack.pop()
+
+        if not children_done:
+            if key(current) in digests:
+                continue
+            stack.append((current, True))
+            for name, _ in sorted_fields(current.__class__):
+                value = getattr(current, name, None)
+                if isinstance(value, ast.AST):
+                    stack.append((value, False))
+                elif isinstance(value, list):
+                    for item in value:
+                        if isinstance(item, ast.AST):
+                            stack.append((item, False))
+            continue
+
+        parts = [current.__class__.__name__]
+        size = 1
+        for name, attr in sorted_fields(current.__class__):
+            try:
+                value = getattr(current, name)
+            except AttributeError:
+                continue
+            parts.append(attr)
+            if isinstance(value, list):
+                items = value
+                parts.append("[")
+            else:
+                items = (value,)
+            for item in items:
+                if isinstance(item, ast.AST):
+                    child_digest, child_size = digests[key(item)]
+                    parts.append(child_digest)
+                    size += child_size
+                else:
+                    parts.append(type(item).__name__ + ":" + repr(item))
+            if items is value:
+                parts.append("]")
+        for name in attributes:
+            if hasattr(current, name):
+                parts.append(name + "=" + repr(getattr(current, name)))
+
+        digests[key(current)] = (_digest("\x00".join(parts)), size)
@@ -1,25 +1,157 @@
 import ast
 
+from astprint.rope import Rope
+from astprint.walker import WalkingVisitor, iter_walk
 
-def as_tree(node, indent="  "):
+
+def as_tree(node, indent="  ", cache=None, stats=None, specialized=False,
+            width=None, rope=False):
     """
     Returns an eval-able string representing a node tree.
 
     The result is the same as given by `ast.dump()`,
     except that the elements of the tree are put on separate lines
     and indented with `indent`s so that the whole tree is more human-readable.
+
+    If `cache` (a `RenderCache` object) is given, rendered statements and
+    expressions are stored in it and reused in subsequent calls.
+
+    If `stats` (a `RenderStats` object) is given, it is filled with
+    the visited node counts and the time spent in the visiting methods.
+
+    If `specialized` is `True`, nodes are printed with functions generated
+    for each node class on its first encounter (see `SpecializedASTPrinter`),
+    which is faster for large trees.
+
+    If `width` is given, a node is kept on a single line whenever the line
+    fits into `width` characters (see `CompactASTPrinter`);
+    it cannot be combined with `specialized`.
+
+    If `rope` is `True`, a `Rope` of the rendered pieces is returned
+    instead of a string.
     """
-    visitor = ASTPrinter(indent)
+    if width is not None:
+        if specialized:
+            raise ValueError("A specialized printer cannot be used with width")
+        visitor = CompactASTPrinter(indent, width, node)
+    else:
+        visitor = (SpecializedASTPrinter if specialized else ASTPrinter)(indent)
+    if cache is not None:
+        visitor.wrappers.append(cache.wrapper(visitor, node))
+    if stats is not None:
+        visitor.wrappers.append(stats.wrapper(visitor))
     visitor.visit(node)
-    return visitor.dumps()
+    result = Rope(visitor.result) if rope else visitor.dumps()
+    if stats is not None:
+        stats.characters += len(result)
+    return result
+
+
+def iter_tree(node, indent="  ", width=None):
+    """
+    Yields the lines of `as_tree(node, indent, width=width)`
+    (without the line breaks)
+    as soon as each of them is complete.
+
+    Only the current line and the traversal stack are kept in memory,
+    so the first lines of a huge tree are available almost immediately.
+    """
+    if width is not None:
+        visitor = CompactASTPrinter(indent, width, node)
+    else:
+        visitor = ASTPrinter(indent)
+    result = visitor.result
+    for _ in iter_walk(visitor, node):
+        if visitor.line_breaks:
+            lines = "".join(result).split("\n")
+            del result[:]
+            result.append(lines.pop())
+            visitor.line_breaks = 0
+            for line in lines:
+                yield line
+    yield "".join(result)
+
+
+_sorted_fields = {}
+
+
+def sorted_fields(node_class):
+    """
+    Returns a list of `(name, name + "=")` for the fields of `node_class`,
+    in the order they appear in the tree dump.
+    """
+    try:
+        return _sorted_fields[node_class]
+    except KeyError:
+        fields = sorted(
+            [(name + "=", name) for name in node_class._fields])
+        result = [(name, attr) for attr, name in fields]
+        _sorted_fields[node_class] = result
+        return result
+
+
+def node_children(node):
+    """
+    Returns the opening and the closing of the dump of `node` (a node or a list)
+    and a list of `(prefix, value)` for its fields or items.
+    """
+    if isinstance(node, list):
+        return "[", "]", [("", child) for child in node]
+
+    children = []
+    for name, attr in sorted_fields(node.__class__):
+        try:
+            children.append((attr, getattr(node, name)))
+        except AttributeError:
+            # Same as `ast.iter_fields()`, skip missing fields
+            pass
+    return type(node).__name__ + "(", ")", children
+
+
+_NESTED = (ast.AST, list)
+
+
+def flat_sizes(node):
+    """
+    Returns a dictionary mapping `id()` of every node and list in the tree
+    of `node` to the length of its one-line dump (see `CompactASTPrinter`).
+    The tree is processed bottom-up, without recursion.
+    """
+    sizes = {}
+    stack = [(node, None)]
+    while stack:
+        current, dump = stack.pop()
+
+        if dump is None:
+            dump = node_children(current)
+            stack.append((current, dump))
+            for _, child in dump[2]:
+                if isinstance(child, _NESTED):
+                    stack.append((child, None))
+            continue
+
+        nodestart, nodeend, children = dump
+        # Fields are separated with ", "
+        size = len(nodestart) + len(nodeend) + 2 * max(len(children) - 1, 0)
+        for attr, child in children:
+            size += len(attr)
+            if isinstance(child, _NESTED):
+                size += sizes[id(child)]
+            else:
+                size += len(repr(child))
+        sizes[id(current)] = size
+
+    return sizes
 
 
-class ASTPrinter(ast.NodeVisitor):
+class ASTPrinter(WalkingVisitor):
 
     def __init__(self, indent):
         self.result = []
         self.indentation = 0
         self.indent_with = indent
+        self.line_breaks = 0
+        self.wrappers = []
 
     def dumps(self):
         return "".join(self.result)
@@ -27,17 +159,30 @@ class ASTPrinter(ast.NodeVisitor):
     def write(self, text):
         self.result.append(text)
 
-    def generic_visit(self, node):
+    def newline(self):
+        self.result.append("\n" + self.indent_with * self.indentation)
+        self.line_breaks += 1
 
-        if isinstance(node, list):
-            nodestart = "["
-            nodeend = "]"
-            children = [("", child) for child in node]
-        else:
-            nodestart = type(node).__name__ + "("
-            nodeend = ")"
-            children = sorted(
-                [(name + "=", value) for name, value in ast.iter_fields(node)])
+    # `RenderCache` support
+
+    digest_attributes = ()
+
+    def cache_key(self, node, digest):
+        return ('tree', digest, self.indent_with, self.indentation)
+
+    def mark(self):
+        return len(self.result)
+
+    def recorded(self, mark):
+        return "".join(self.result[mark:]), None
+
+    def splice(self, value):
+        text, _ = value
+        self.result.append(text)
+        self.line_breaks += text.count("\n")
+
+    def generic_visit(self, node):
+        nodestart, nodeend, children = node_children(node)
 
         if len(children) > 1:
             self.indentation += 1
@@ -46,10 +191,10 @@ class ASTPrinter(ast.NodeVisitor):
         for i, pair in enumerate(children):
             attr, child = pair
             if len(children) > 1:
-                self.write("\n" + self.indent_with * self.indentation)
+                self.newline()
             if isinstance(child, (ast.AST, list)):
                 self.write(attr)
-                self.visit(child)
+                yield child
             else:
                 self.write(attr + repr(child))
 
@@ -59,3 +204,227 @@ class ASTPrinter(ast.NodeVisitor):
 
         if len(children) > 1:
             self.indentation -= 1
+
+    # Py>=3.8 `NodeVisitor` redirects constants to the methods
+    # for the legacy literal classes; all nodes are printed the same way here.
+    visit_Constant = generic_visit
+
+
+class CompactASTPrinter(ASTPrinter):
+    """
+    Prints the same tree as `ASTPrinter`, but puts a node on a single line,
+    with its fields separated by ", ", whenever it fits into `width`
+    characters together with the text that has to follow it on the same line
+    (a comma or the closing brackets of its parents).
+
+    The one-line lengths of all subtrees are computed in advance
+    (see `flat_sizes`), so the decision for each node takes constant time,
+    and the layout is linear in the size of the tree.
+    With `width=0` the output is the same as the one of `ASTPrinter`.
+    """
+
+    def __init__(self, indent, width, root):
+        ASTPrinter.__init__(self, indent)
+        self.width = width
+        self.sizes = flat_sizes(root)
+        self.column = 0
+        # The length of the text following the node being entered on its line
+        self.trailing = 0
+        # The number of enclosing nodes printed on a single line
+        self.flat = 0
+
+    def write(self, text):
+        self.result.append(text)
+        self.column += len(text)
+
+    def newline(self):
+        ASTPrinter.newline(self)
+        self.column = len(self.indent_with) * self.indentation
+
+    def cache_key(self, node, digest):
+        return ('tree', digest, self.indent_with, self.indentation,
+                self.width, self.column, self.trailing, self.flat > 0)
+
+    def splice(self, value):
+        ASTPrinter.splice(self, value)
+        text, _ = value
+        line_start = text.rfind("\n")
+        if line_start == -1:
+            self.column += len(text)
+        else:
+            self.column = len(text) - line_start - 1
+
+    def generic_visit(self, node):
+        nodestart, nodeend, children = node_children(node)
+        trailing = self.trailing
+        last = len(children) - 1
+
+        broken = flat = False
+        if last > 0:
+            if self.flat:
+                flat = True
+            elif self.column + self.sizes[id(node)] + trailing > self.width:
+                broken = True
+            else:
+                flat = True
+        if broken:
+            self.indentation += 1
+        if flat:
+            self.flat += 1
+
+        self.write(nodestart)
+        for i, (attr, child) in enumerate(children):
+            if broken:
+                self.newline()
+            elif i:
+                self.write(" ")
+            if isinstance(child, _NESTED):
+                self.write(attr)
+                self.trailing = 1 if i != last else len(nodeend) + trailing
+                yield child
+            else:
+                self.write(attr + repr(child))
+
+            if i != last:
+                self.write(",")
+        self.write(nodeend)
+
+        if broken:
+            self.indentation -= 1
+        if flat:
+            self.flat -= 1
+
+    visit_Constant = generic_visit
+
+
+_emitters = {}
+
+
+def _emitter_source(node_class, function_name):
+    """
+    Returns the source of a function printing nodes of `node_class`
+    in the same way `ASTPrinter.generic_visit` does.
+    """
+    fields = sorted_fields(node_class)
+    start = node_class.__name__ + "("
+    lines = ["def {0}(self, node):".format(function_name)]
+
+    if not fields:
+        lines.append("    self.result.append({0!r})".format(start + ")"))
+        return "\n".join(lines)
+
+    # Missing fields change the layout, leave them to the generic method
+    lines.append("    try:")
+    for i, (name, _) in enumerate(fields):
+        lines.append("        value{0} = node.{1}".format(i, name))
+    lines.append("    except AttributeError:")
+    lines.append("        yield generic_visit(self, node)")
+    lines.append("        return")
+
+    if len(fields) == 1:
+        prefix = start + fields[0][1]
+        lines.extend([
+            "    if isinstance(value0, nested):",
+            "        self.result.append({0!r})".format(prefix),
+            "        yield value0",
+            "        self.result.append(')')",
+            "    else:",
+            "        self.result.append({0!r} + repr(value0) + ')')".format(prefix),
+        ])
+        return "\n".join(lines)
+
+    lines.extend([
+        "    append = self.result.append",
+        "    self.indentation += 1",
+        "    separator = self.separator()",
+        "    self.line_breaks += {0}".format(len(fields)),
+    ])
+    for i, (_, attr) in enumerate(fields):
+        opening = start if i == 0 else ","
+        lines.extend([
+            "    if isinstance(value{0}, nested):".format(i),
+            "        append({0!r} + separator + {1!r})".format(opening, attr),
+            "        yield value{0}".format(i),
+            "    else:",
+            "        append({0!r} + separator + {1!r} + repr(value{2}))".format(
+                opening, attr, i),
+        ])
+    lines.extend([
+        "    append(')')",
+        "    self.indentation -= 1",
+    ])
+    return "\n".join(lines)
+
+
+def make_emitter(node_class):
+    """
+    Returns a visiting method for `SpecializedASTPrinter`
+    generated for `node_class` (cached).
+    """
+    try:
+        return _emitters[node_class]
+    except KeyError:
+        function_name = "emit_" + node_class.__name__
+        namespace = dict(nested=_NESTED, generic_visit=ASTPrinter.generic_visit)
+        exec(_emitter_source(node_class, function_name), namespace)
+        emitter = namespace[function_name]
+        _emitters[node_class] = emitter
+        return emitter
+
+
+class SpecializedASTPrinter(ASTPrinter):
+    """
+    Produces the same output as `ASTPrinter`, but instead of handling
+    all nodes with `generic_visit`, generates a function for each node class
+    with the field order, the layout and the constant parts of the output
+    fixed in advance (see `make_emitter`).
+    See the `as_tree_specialized` entries of `benchmarks/run.py`
+    for the speedup.
+    """
+
+    def __init__(self, indent):
+        ASTPrinter.__init__(self, indent)
+        self._separators = []
+
+    @classmethod
+    def find_method(cls, node_class):
+        method = super(SpecializedASTPrinter, cls).find_method(node_class)
+        if method is ASTPrinter.generic_visit and issubclass(node_class, ast.AST):
+            method = make_emitter(node_class)
+        return method
+
+    def separator(self):
+        try:
+            return self._separators[self.indentation]
+        except IndexError:
+            while len(self._separators) <= self.indentation:
+                self._separators.append(
+                    "\n" + self.indent_with * len(self._separators))
+            return self._separators[self.indentation]
+
+    def visit_list(self, node):
+        append = self.result.append
+        if len(node) > 1:
+            self.indentation += 1
+            separator = self.separator()
+            self.line_breaks += len(node)
+            prefix = "[" + separator
+            for child in node:
+                if isinstance(child, _NESTED):
+                    append(prefix)
+                    yield child
+                else:
+                    append(prefix + repr(child))
+                prefix = "," + separator
+            append("]")
+            self.indentation -= 1
+        elif node:
+            child = node[0]
+            if isinstance(child, _NESTED):
+                append("[")
+                yield child
+                append("]")
+            else:
+                append("[" + repr(child) + "]")
+        else:
+            append("[]")
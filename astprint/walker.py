@@ -0,0 +1,174 @@
+"""
+Explicit-stack traversal used by the printers.
+
+Visitor methods are written as generators: instead of calling
+``self.visit(child)`` they ``yield child`` (or yield another generator,
+for example a helper rendering a block of statements),
+and the walker visits it before resuming the method.
+This way the depth of the tree is limited by the available memory,
+and not by the Python recursion limit.
+
+Visiting methods are looked up once per visitor class and node class
+and kept in a `DispatchTable`; a method returns a generator,
+or ``None`` if the node is fully processed.
+"""
+
+import ast
+import types
+
+
+class DispatchTable(dict):
+    """
+    Maps node classes to the unbound visiting methods of `visitor_class`,
+    resolving missing entries on first access with `find_method()`.
+    """
+
+    def __init__(self, visitor_class):
+        dict.__init__(self)
+        self.visitor_class = visitor_class
+
+    def __missing__(self, node_class):
+        method = self.visitor_class.find_method(node_class)
+        self[node_class] = method
+        return method
+
+
+class WrappedTable(dict):
+    """
+    A dispatch table with each method of `base` passed through `wrappers`.
+    A wrapper is called as `wrapper(node_class, method)` and returns
+    a function with the same signature as `method`
+    (or `method` itself, if nodes of this class do not need wrapping).
+    """
+
+    def __init__(self, base, wrappers):
+        dict.__init__(self)
+        self.base = base
+        self.wrappers = wrappers
+
+    def __missing__(self, node_class):
+        method = self.base[node_class]
+        for wrapper in self.wrappers:
+            method = wrapper(node_class, method)
+        self[node_class] = method
+        return method
+
+
+_dispatch_tables = {}
+
+
+def dispatch_table(visitor_class):
+    try:
+        return _dispatch_tables[visitor_class]
+    except KeyError:
+        table = DispatchTable(visitor_class)
+        _dispatch_tables[visitor_class] = table
+        return table
+
+
+def walk(visitor, node):
+    """
+    Visits `node` and everything it yields with `visitor`.
+    """
+    table = visitor.get_dispatch_table()
+    generator_type = types.GeneratorType
+
+    gen = table[node.__class__](visitor, node)
+    if gen is None:
+        return
+
+    stack = [gen]
+    push = stack.append
+    pop = stack.pop
+    while stack:
+        # Iterating with ``for`` is cheaper than catching ``StopIteration``
+        # after every ``next()``; after a ``break`` the loop is simply resumed
+        # on the same generator when it gets to the top of the stack again.
+        for item in stack[-1]:
+            if type(item) is not generator_type:
+                item = table[item.__class__](visitor, item)
+                if item is None:
+                    continue
+            push(item)
+            break
+        else:
+            pop()
+
+
+def iter_walk(visitor, node):
+    """
+    Same as `walk`, but suspends after each dispatched node,
+    yielding nothing. Allows the caller to process the output
+    while the traversal is still in progress.
+    """
+    table = visitor.get_dispatch_table()
+    generator_type = types.GeneratorType
+
+    gen = table[node.__class__](visitor, node)
+    yield
+    if gen is None:
+        return
+
+    stack = [gen]
+    push = stack.append
+    pop = stack.pop
+    while stack:
+        for item in stack[-1]:
+            if type(item) is not generator_type:
+                item = table[item.__class__](visitor, item)
+                yield
+                if item is None:
+                    continue
+            push(item)
+            break
+        else:
+            pop()
+
+
+class WalkingVisitor(ast.NodeVisitor):
+    """
+    A `NodeVisitor` with generator-based visiting methods,
+    driven by `walk` instead of recursion.
+
+    A visiting method yields the nodes to visit (and other generators,
+    which are run in place) instead of calling `self.visit()` on them;
+    a method which does not yield anything may return `None`.
+    Helpers which visit nodes (like `SourceGeneratorNodeVisitor.body()`)
+    are generators as well, so they do nothing unless they are yielded:
+    `yield self.body(node.body)`, not `self.body(node.body)`.
+    """
+
+    # Functions modifying the visiting methods (see `WrappedTable`).
+    # Subclasses set it to a list in their constructors.
+    wrappers = ()
+
+    def visit(self, node):
+        walk(self, node)
+
+    @classmethod
+    def find_method(cls, node_class):
+        """
+        Returns the unbound method visiting nodes of `node_class`.
+        """
+        method = getattr(cls, 'visit_' + node_class.__name__, None)
+        if method is None:
+            method = cls.generic_visit
+        return method
+
+    def get_dispatch_table(self):
+        table = dispatch_table(type(self))
+        if self.wrappers:
+            table = WrappedTable(table, self.wrappers)
+        return table
+
+    def dispatch(self, node):
+        return self.get_dispatch_table()[node.__class__](self, node)
+
+    def generic_visit(self, node):
+        for _, value in ast.iter_fields(node):
+            if isinstance(value, list):
+                for item in value:
+                    if isinstance(item, ast.AST):
+                        yield item
+            elif isinstance(value, ast.AST):
+                yield value
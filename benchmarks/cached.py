@@ -0,0 +1,96 @@
+"""
+Compares rendering large modules with a warm `RenderCache`,
+and re-rendering them with `as_code_incremental` after a small edit,
+to rendering them without a cache.
+
+Usage: python benchmarks/cached.py [FILE ...]
+(by default, a few large modules from the standard library are used)
+
+Exits with status 1 if a cached or incremental render is not faster
+than an uncached one.
+"""
+
+import ast
+import copy
+import os
+import sys
+import timeit
+import weakref
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from astprint import as_code, as_code_incremental, as_tree, RenderCache
+
+from per_node import default_files
+
+
+def best_time(func, repeat=5):
+    return min(timeit.repeat(func, number=1, repeat=repeat))
+
+
+def warm_time(render, node):
+    cache = RenderCache()
+    render(node, cache=cache)
+    return best_time(lambda: render(node, cache=cache))
+
+
+def edit(node):
+    """
+    Returns a copy of `node` with a name changed in the innermost last
+    simple statement, copying only the statements containing it
+    and sharing the others with `node`.
+    """
+    node = parent = copy.copy(node)
+    while True:
+        parent.body = list(parent.body)
+        statement = parent.body[-1]
+        if not getattr(statement, 'body', None):
+            break
+        parent.body[-1] = copy.copy(statement)
+        parent = parent.body[-1]
+    statement = parent.body[-1] = copy.deepcopy(statement)
+    for child in ast.walk(statement):
+        if isinstance(child, ast.Name):
+            child.id += "_"
+            break
+    return node
+
+
+def incremental_time(node, repeat=5):
+    memo = weakref.WeakKeyDictionary()
+    previous = as_code_incremental(node, memo=memo)
+    times = []
+    for _ in range(repeat):
+        edited = edit(node)
+        times.append(best_time(
+            lambda: as_code_incremental(edited, previous, memo=memo), 1))
+    return min(times)
+
+
+def main(argv):
+    files = argv or default_files()
+    print("{0:<20} {1:<8} {2:>12} {3:>12} {4:>9}".format(
+        "file", "mode", "uncached, s", "cached, s", "speedup"))
+    slower = False
+    for path in files:
+        with open(path) as f:
+            node = ast.parse(f.read())
+        for mode, render in [("code", as_code), ("tree", as_tree)]:
+            uncached = best_time(lambda: render(node))
+            cached = warm_time(render, node)
+            slower = slower or cached >= uncached
+            print("{0:<20} {1:<8} {2:>12.4f} {3:>12.4f} {4:>9.1f}".format(
+                os.path.basename(path), mode, uncached, cached,
+                uncached / cached))
+
+        uncached = best_time(lambda: as_code(node))
+        incremental = incremental_time(node)
+        slower = slower or incremental >= uncached
+        print("{0:<20} {1:<8} {2:>12.4f} {3:>12.4f} {4:>9.1f}".format(
+            os.path.basename(path), "edit", uncached, incremental,
+            uncached / incremental))
+    return 1 if slower else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,43 @@
+"""
+Measures the average rendering time per AST node for large modules.
+
+Usage: python benchmarks/per_node.py [FILE ...]
+(by default, a few large modules from the standard library are used)
+"""
+
+import ast
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from astprint import as_code, as_tree
+
+
+def default_files():
+    stdlib = os.path.dirname(ast.__file__)
+    names = ["ast.py", "argparse.py", "inspect.py", "typing.py"]
+    return [os.path.join(stdlib, name) for name in names]
+
+
+def per_node(func, node, repeat=5):
+    num_nodes = sum(1 for _ in ast.walk(node))
+    best = min(timeit.repeat(lambda: func(node), number=1, repeat=repeat))
+    return best / num_nodes * 1e6
+
+
+def main(argv):
+    files = argv or default_files()
+    print("{0:<20} {1:>8} {2:>14} {3:>14}".format(
+        "file", "nodes", "as_code, us", "as_tree, us"))
+    for path in files:
+        with open(path) as f:
+            node = ast.parse(f.read())
+        print("{0:<20} {1:>8} {2:>14.3f} {3:>14.3f}".format(
+            os.path.basename(path), sum(1 for _ in ast.walk(node)),
+            per_node(as_code, node), per_node(as_tree, node)))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,163 @@
+"""
+Benchmarks of `as_code`, `as_tree` and `load_tree` on synthetic trees,
+compared to `ast.unparse`, `ast.dump` and `eval()`, respectively.
+
+Usage:
+
+    python benchmarks/run.py [--quick] [--output results.json]
+        [--baseline baseline.json] [--threshold 0.25]
+
+The results are printed as a table and, if `--output` is given,
+saved as JSON. If `--baseline` (a file saved earlier with `--output`) is given,
+the script exits with status 1 if any benchmark became slower
+than the baseline by more than `threshold` (a fraction).
+Timings are compared relative to the standard library functions
+measured in the same run, so that baselines recorded on a different machine
+are still meaningful.
+"""
+
+import argparse
+import ast
+import json
+import os
+import platform
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+import astprint
+from astprint import as_code, as_tree, load_tree
+
+from trees import GENERATORS
+
+
+SIZES = dict(
+    wide_module=20000,
+    deep_expression=200,
+    large_literal=20000,
+    classes_and_functions=500,
+)
+
+QUICK_SIZES = dict(
+    wide_module=2000,
+    deep_expression=100,
+    large_literal=2000,
+    classes_and_functions=50,
+)
+
+def eval_tree(text):
+    return eval(text, ast.__dict__)
+
+
+def as_tree_specialized(node):
+    return as_tree(node, specialized=True)
+
+
+# Benchmark name, function, the standard library function to compare with,
+# and the function creating their argument from the tree
+BENCHMARKS = [
+    ('as_code', as_code, getattr(ast, 'unparse', None), None),
+    ('as_tree', as_tree, ast.dump, None),
+    ('as_tree_specialized', as_tree_specialized, ast.dump, None),
+    ('load_tree', load_tree, eval_tree, as_tree),
+]
+
+
+def best_time(func, arg, repeat):
+    return min(timeit.repeat(lambda: func(arg), number=1, repeat=repeat))
+
+
+def reference_time(func, arg, repeat):
+    if func is None:
+        return None
+    try:
+        return best_time(func, arg, repeat)
+    except (RecursionError, SyntaxError, MemoryError):
+        # eval() cannot handle deeply nested expressions
+        return None
+
+
+def run(sizes, repeat):
+    results = []
+    for tree_name in sorted(GENERATORS):
+        size = sizes[tree_name]
+        node = GENERATORS[tree_name](size)
+        num_nodes = sum(1 for _ in ast.walk(node))
+        for renderer_name, func, reference, prepare in BENCHMARKS:
+            arg = node if prepare is None else prepare(node)
+            seconds = best_time(func, arg, repeat)
+            reference_seconds = reference_time(reference, arg, repeat)
+            results.append(dict(
+                name=tree_name + "/" + renderer_name,
+                size=size,
+                nodes=num_nodes,
+                seconds=seconds,
+                reference_seconds=reference_seconds,
+                relative=(
+                    seconds / reference_seconds if reference_seconds else None)))
+    return results
+
+
+def find_regressions(results, baseline, threshold):
+    baseline = dict((result['name'], result) for result in baseline['results'])
+    regressions = []
+    for result in results:
+        old = baseline.get(result['name'])
+        if old is None or old['size'] != result['size']:
+            continue
+        if result['relative'] is not None and old['relative'] is not None:
+            key = 'relative'
+        else:
+            key = 'seconds'
+        if result[key] > old[key] * (1 + threshold):
+            regressions.append((result['name'], old[key], result[key]))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument('--quick', action='store_true',
+        help="use smaller trees")
+    parser.add_argument('--repeat', type=int, default=5,
+        help="number of timing repetitions (the best one is taken)")
+    parser.add_argument('--output', help="save the results to a JSON file")
+    parser.add_argument('--baseline', help="compare with the results in a JSON file")
+    parser.add_argument('--threshold', type=float, default=0.25,
+        help="maximum allowed slowdown relative to the baseline")
+    args = parser.parse_args(argv)
+
+    results = run(QUICK_SIZES if args.quick else SIZES, args.repeat)
+
+    print("{0:<32} {1:>8} {2:>12} {3:>12} {4:>9}".format(
+        "benchmark", "nodes", "seconds", "reference", "relative"))
+    for result in results:
+        print("{0:<32} {1:>8} {2:>12.4f} {3:>12} {4:>9}".format(
+            result['name'], result['nodes'], result['seconds'],
+            "-" if result['reference_seconds'] is None
+                else "{0:.4f}".format(result['reference_seconds']),
+            "-" if result['relative'] is None
+                else "{0:.2f}".format(result['relative'])))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(dict(
+                version=getattr(astprint, '__version__', None),
+                python=platform.python_version(),
+                implementation=platform.python_implementation(),
+                results=results), f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = find_regressions(results, baseline, args.threshold)
+        for name, old, new in regressions:
+            print("Regression in {0}: {1:.4f} -> {2:.4f}".format(name, old, new))
+        if regressions:
+            return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
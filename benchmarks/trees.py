@@ -0,0 +1,84 @@
+"""
+Synthetic trees for the benchmarks.
+
+Each generator takes a size parameter and returns an `ast.Module`.
+"""
+
+import ast
+
+
+def wide_module(size):
+    """
+    A module with `size` simple top-level statements.
+    """
+    lines = []
+    for i in range(size):
+        lines.append("a{0} = b{0} * {0} + c.d[{0}]".format(i))
+    return ast.parse("\n".join(lines))
+
+
+def deep_expression(size):
+    """
+    A single statement with a chain of `size` nested binary operations
+    and calls.
+    """
+    expr = "x"
+    for i in range(size):
+        if i % 2:
+            expr = "f({0}, {1})".format(expr, i)
+        else:
+            expr = "{0} + {1}".format(expr, i)
+    return ast.parse("y = " + expr)
+
+
+def large_literal(size):
+    """
+    A data table: a dictionary with `size` entries of mixed literals.
+    """
+    items = []
+    for i in range(size):
+        items.append("{0!r}: [{1}, {2!r}, {3}, None]".format(
+            "key" + str(i), i, "value" + str(i), i * 0.5))
+    return ast.parse("TABLE = {" + ", ".join(items) + "}")
+
+
+def classes_and_functions(size):
+    """
+    `size` classes, each with a few decorated methods with control flow.
+    """
+    template = '''
+class Class{0}(Base, metaclass=Meta):
+
+    attribute = {0}
+
+    def __init__(self, x, y=1, *args, **kwds):
+        self.x = x
+        self.y = y
+
+    @property
+    def value(self):
+        if self.x > {0}:
+            return self.x
+        elif self.y:
+            return -self.y
+        else:
+            return [i for i in range(self.x) if i % 2]
+
+    def method(self, items):
+        result = 0
+        for item in items:
+            try:
+                result += item.value
+            except AttributeError as e:
+                continue
+        return result
+'''
+    return ast.parse("\n".join(template.format(i) for i in range(size)))
+
+
+GENERATORS = dict(
+    wide_module=wide_module,
+    deep_expression=deep_expression,
+    large_literal=large_literal,
+    classes_and_functions=classes_and_functions,
+)
@@ -1,5 +1,6 @@
 #!/usr/bin/env python
 
+import re
 import sys
 from setuptools import setup, find_packages
 from setuptools.command.test import test as TestCommand
@@ -17,16 +18,25 @@ class PyTest(TestCommand):
         sys.exit(errno)
 
 
+def get_version():
+    with open("astprint/__init__.py") as f:
+        return re.search(r'^__version__ = "(.*)"$', f.read(), re.M).group(1)
+
+
 setup(
     name="astprint",
-    version="1.0.1+dev",
+    version=get_version(),
     description="AST printers",
     long_description=open("README.rst").read(),
     url="https://github.com/Manticore/astprint",
     author="Bogdan Opanchuk",
     author_email="bogdan@opanchuk.net",
     packages=find_packages(),
+    python_requires=">=3.7",
     install_requires=[],
+    entry_points={
+        'console_scripts': ['astprint = astprint.cli:main'],
+    },
     tests_require=["pytest"],
     cmdclass={'test': PyTest},
     platforms=["any"],
@@ -38,13 +48,13 @@ setup(
         "Intended Audience :: Developers",
         "License :: OSI Approved :: MIT License",
         "Programming Language :: Python",
-        "Programming Language :: Python :: 2",
-        "Programming Language :: Python :: 2.6",
-        "Programming Language :: Python :: 2.7",
         "Programming Language :: Python :: 3",
-        "Programming Language :: Python :: 3.2",
-        "Programming Language :: Python :: 3.3",
-        "Programming Language :: Python :: 3.4",
+        "Programming Language :: Python :: 3 :: Only",
+        "Programming Language :: Python :: 3.7",
+        "Programming Language :: Python :: 3.8",
+        "Programming Language :: Python :: 3.9",
+        "Programming Language :: Python :: 3.10",
+        "Programming Language :: Python :: 3.11",
         "Topic :: Software Development :: Code Generators",
         "Topic :: Software Development :: Libraries :: Python Modules",
     ],
@@ -0,0 +1,85 @@
+import ast
+import asyncio
+import concurrent.futures
+
+import pytest
+
+from astprint import as_code, as_tree, as_code_async, as_tree_async
+
+
+SOURCE = "\n".join(
+    "def func{0}(x, a=1):\n    return [x + a * {0}, call(x)]".format(i)
+    for i in range(50))
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+def test_result():
+    node = ast.parse(SOURCE)
+    assert run(as_code_async(node)) == as_code(node)
+    assert run(as_code_async(node, max_line_length=20)) == as_code(
+        node, max_line_length=20)
+    assert run(as_tree_async(node, indent="\t")) == as_tree(node, indent="\t")
+    assert run(as_tree_async(node, width=60)) == as_tree(node, width=60)
+    assert run(as_code_async(node, interval=0.001)) == as_code(node)
+
+
+def test_line_gaps():
+    node = ast.parse(SOURCE)
+    for statement in node.body[1:]:
+        ast.increment_lineno(statement, 1000)
+    expected_map = []
+    as_code(node, max_line_gap=2, line_map=expected_map)
+    assert len(expected_map) > 1
+
+    with concurrent.futures.ThreadPoolExecutor(1) as executor:
+        for kwds in [{}, dict(max_line_length=20), dict(executor=executor)]:
+            line_map = []
+            assert run(as_code_async(
+                node, max_line_gap=2, line_map=line_map, **kwds)) == as_code(
+                    node, max_line_gap=2,
+                    max_line_length=kwds.get('max_line_length'))
+            if not kwds.get('max_line_length'):
+                assert line_map == expected_map
+    assert run(as_code_async(node, max_line_gap=0)) == as_code(
+        node, max_line_gap=0)
+
+
+def test_yields_to_event_loop():
+    node = ast.parse(SOURCE)
+    ticks = []
+
+    async def ticker():
+        while True:
+            ticks.append(None)
+            await asyncio.sleep(0)
+
+    async def main():
+        task = asyncio.ensure_future(ticker())
+        await asyncio.sleep(0)
+        ticks_before = len(ticks)
+        result = await as_code_async(node, every=10)
+        task.cancel()
+        return result, len(ticks) - ticks_before
+
+    result, ticks_during = run(main())
+    assert result == as_code(node)
+    assert ticks_during > 10
+
+
+def test_executor():
+    node = ast.parse(SOURCE)
+    with concurrent.futures.ThreadPoolExecutor(1) as executor:
+        assert run(as_code_async(node, executor=executor)) == as_code(node)
+        assert run(as_tree_async(node, executor=executor)) == as_tree(node)
+
+
+def test_invalid_every():
+    with pytest.raises(ValueError):
+        run(as_code_async(ast.parse(SOURCE), every=0))
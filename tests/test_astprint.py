@@ -6,7 +6,7 @@ import sys
 
 import pytest
 
-from astprint import as_code, as_tree
+from astprint import as_code, as_tree, iter_tree, write_code, RenderCache, SourceMap
 
 
 def unshift(source):
@@ -48,6 +48,7 @@ def check_transformation(source):
     tree_dump = as_tree(node)
     new_node = eval(tree_dump, ast.__dict__)
     assert_ast_equal(node, new_node)
+    assert as_tree(node, specialized=True) == tree_dump
 
 
 def skip_if_after(major, minor):
@@ -367,6 +368,98 @@ def test_body_else():
         """)
 
 
+def test_precedence():
+    # Only the parentheses needed to keep the tree are written
+    expressions = [
+        "a + b * c",
+        "(a + b) * c",
+        "a - b - c",
+        "a - (b - c)",
+        "a ** b ** c",
+        "(a ** b) ** c",
+        "(-a) ** b",
+        "a ** -b",
+        "-a.b",
+        "(-a).b",
+        "(a + b)[c](d)",
+        "not a and b",
+        "not (a and b)",
+        "a and b or c",
+        "a and (b or c)",
+        "(a and b) and c",
+        "a < b < c",
+        "(a < b) < c",
+        "a < (b if c else d)",
+        "a if b else c if d else e",
+        "(a if b else c) if d else e",
+        "(lambda x: a) or b",
+        "f(lambda x: a, b if c else d)",
+        "[x for x in (a if b else c) if (lambda y: x)]",
+        "*(a or b),",
+        "(yield a) + 1",
+    ]
+    for source in expressions:
+        code = as_code(ast.parse(source))
+        assert code == source or (
+            source.endswith(",") and code == "(" + source + ")")
+        assert ast.dump(ast.parse(code)) == ast.dump(ast.parse(source))
+
+
+@pytest.mark.parametrize('source', [
+    "a @ b",
+    "a @ b * c",
+    "a @ (b * c)",
+    "a @= b",
+    "(a := 1)",
+    "x = (y := f(a))",
+    "if (a := f()):\n    pass",
+    "[y for x in a if (y := f(x))]",
+    "(a := 1).b",
+    "-(a := 1)",
+    "(1).real",
+    "1.5.real",
+    "(-1) ** 2",
+    "2 ** -1",
+    "a[-1]",
+    "f(-1, -2.5)",
+])
+def test_round_trip(source):
+    node = ast.parse(source)
+    code = as_code(node)
+    assert ast.dump(ast.parse(code)) == ast.dump(node)
+
+
+def number(value):
+    return ast.Constant(value=value)
+
+
+@pytest.mark.parametrize('expression', [
+    ast.BinOp(left=number(-1), op=ast.Pow(), right=number(2)),
+    ast.BinOp(left=number(-1.5), op=ast.Pow(), right=number(2)),
+    ast.UnaryOp(op=ast.USub(), operand=ast.BinOp(
+        left=number(-2), op=ast.Pow(), right=number(2))),
+    ast.UnaryOp(op=ast.USub(), operand=number(-1)),
+    ast.Attribute(value=number(1), attr='real', ctx=ast.Load()),
+    ast.Attribute(value=number(-1), attr='real', ctx=ast.Load()),
+    ast.Attribute(value=number(True), attr='real', ctx=ast.Load()),
+    ast.BinOp(left=number(3), op=ast.Sub(), right=number(-1)),
+])
+def test_constant_round_trip(expression):
+    # Negative constants come from constant folding and generated code;
+    # they are parsed back as unary operations, but must keep the value
+    expression = ast.fix_missing_locations(ast.Expression(body=expression))
+    code = as_code(expression)
+    assert eval(code) == eval(compile(expression, '<ast>', 'eval'))
+
+
+def test_long_chain():
+    node = ast.parse(" + ".join("a{0} * b - c".format(i) for i in range(100)))
+    assert as_code(node) == " + ".join(
+        "a{0} * b - c".format(i) for i in range(100))
+    # With wrappers installed, every operation is visited separately
+    assert as_code(node, cache=RenderCache(min_nodes=1)) == as_code(node)
+
+
 def test_ternary_if_else():
     check_transformation(
         """
@@ -504,3 +597,229 @@ def test_repr():
         """
         a = `b`
         """)
+
+
+def test_line_tracking_is_linear():
+    # Line alignment used to re-join the whole output for every statement,
+    # making the rendering time quadratic in the size of the module.
+    import timeit
+
+    def per_statement(num):
+        node = ast.parse("\n".join("a{0} = b{0}".format(i) for i in range(num)))
+        best = min(timeit.repeat(lambda: as_code(node), number=1, repeat=3))
+        return best / num
+
+    small = per_statement(1000)
+    large = per_statement(16000)
+    assert large < small * 3
+
+
+class RecordingFile(object):
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, text):
+        self.chunks.append(text)
+
+    def getvalue(self):
+        return "".join(self.chunks)
+
+
+def test_write_code():
+    source = unshift(
+        """
+        def func(x, a=1):
+            return x + a
+
+
+        a = 1
+        b = 2
+        """)
+    node = ast.parse(source)
+
+    fp = RecordingFile()
+    write_code(node, fp)
+    assert fp.getvalue() == as_code(node)
+
+    # A small buffer makes the visitor flush several times during rendering
+    fp = RecordingFile()
+    write_code(node, fp, buffer_size=4)
+    assert len(fp.chunks) > 1
+    assert fp.getvalue() == as_code(node)
+
+
+def test_max_line_length():
+    source = unshift(
+        """
+        def func(x, a=1):
+            return [call(x, a), {'key': [i for i in x if i]}, (a,)]
+
+
+        data = call(first_argument, second_argument)
+        """)
+    node = ast.parse(source)
+    assert as_code(node, max_line_length=100) == as_code(node)
+
+    # The broken lines take the place of the empty lines
+    # of the line alignment
+    code = as_code(node, max_line_length=40)
+    assert code == unshift(
+        """
+        def func(x, a=1):
+            return [
+                call(x, a),
+                {'key': [i for i in x if i]},
+                (a,)
+            ]
+        data = call(
+            first_argument,
+            second_argument
+        )""")
+    assert ast.dump(ast.parse(code)) == ast.dump(ast.parse(as_code(node)))
+
+    for max_line_length in [1, 20, 30]:
+        code = as_code(node, max_line_length=max_line_length)
+        assert ast.dump(ast.parse(code)) == ast.dump(ast.parse(as_code(node)))
+        fp = RecordingFile()
+        write_code(node, fp, buffer_size=4, max_line_length=max_line_length)
+        assert fp.getvalue() == code
+
+    with pytest.raises(ValueError):
+        as_code(node, max_line_length=40, source_map=SourceMap())
+
+
+def test_max_line_gap():
+    node = ast.parse(unshift(
+        """
+        import os
+
+
+        def func(x):
+            return x
+        class A:
+            pass
+        """))
+    for statement in node.body[1:]:
+        ast.increment_lineno(statement, 1000000)
+    assert len(as_code(node)) > 1000000
+
+    line_map = []
+    code = as_code(node, max_line_gap=2, line_map=line_map)
+    assert code == unshift(
+        """
+        import os
+
+
+        def func(x):
+            return x
+        class A:
+            pass
+        """)
+    assert line_map == [(1, 1), (4, 1000004)]
+
+    line_map = []
+    assert as_code(node, max_line_gap=0, line_map=line_map) == unshift(
+        """
+        import os
+        def func(x):
+            return x
+        class A:
+            pass
+        """)
+    assert line_map == []
+
+    line_map = []
+    fp = RecordingFile()
+    write_code(node, fp, buffer_size=4, max_line_gap=2, line_map=line_map)
+    assert fp.getvalue() == code
+    assert line_map == [(1, 1), (4, 1000004)]
+
+    cache = RenderCache(min_nodes=1)
+    for max_line_gap in [0, 2, 0, 2]:
+        assert as_code(node, cache=cache, max_line_gap=max_line_gap) == as_code(
+            node, max_line_gap=max_line_gap)
+    assert cache.stats()['hits']
+
+
+def test_write_code_strips_newlines():
+    # Line alignment produces leading newlines which as_code() strips
+    node = ast.parse("\n\n\na = 1")
+    fp = RecordingFile()
+    write_code(node, fp, buffer_size=1)
+    assert fp.getvalue() == as_code(node) == "a = 1"
+
+
+def test_iter_tree():
+    node = ast.parse(unshift(
+        """
+        def func(x, a=1):
+            return x + a
+        """))
+    assert "\n".join(iter_tree(node)) == as_tree(node)
+    assert "\n".join(iter_tree(node, indent="\t")) == as_tree(node, indent="\t")
+
+
+def test_iter_tree_is_lazy():
+    class Unprintable(object):
+        def __repr__(self):
+            raise RuntimeError("rendered too early")
+
+    node = ast.List(elts=[ast.Pass(), ast.Pass(), Unprintable()])
+    lines = iter_tree(node)
+    assert next(lines) == "List(elts=["
+    assert next(lines) == "  Pass(),"
+    with pytest.raises(RuntimeError):
+        next(lines)
+
+
+def test_deep_tree():
+    # Deeper than the default recursion limit
+    depth = sys.getrecursionlimit() * 5
+    expr = ast.Name(id='a', ctx=ast.Load())
+    for _ in range(depth):
+        expr = ast.BinOp(
+            left=expr, op=ast.Add(), right=ast.Name(id='a', ctx=ast.Load()))
+
+    assert as_code(expr) == " + ".join(["a"] * (depth + 1))
+
+    assert as_tree(expr).count("BinOp(") == depth
+
+
+def test_specialized_tree():
+    # Nodes with missing fields, lists of non-node values and custom indents
+    nodes = [
+        ast.Name(id='x'),
+        ast.Global(names=['a', 'b']),
+        ast.Global(names=['a']),
+        ast.List(elts=[]),
+        ast.Module(body=[ast.Pass()], type_ignores=[]),
+        ast.parse("def f(x, *a, **k):\n    return [i for i in x if i]"),
+    ]
+    for node in nodes:
+        for indent in ["  ", "\t"]:
+            assert as_tree(node, indent=indent, specialized=True) == as_tree(node, indent=indent)
+
+
+def test_compact_tree():
+    node = ast.parse(unshift(
+        """
+        def func(x, a=1):
+            return [x + a, func(x)]
+        """))
+    assert as_tree(node, width=0) == as_tree(node)
+    assert eval(as_tree(node, width=1000), ast.__dict__).__class__ is ast.Module
+    assert "\n" not in as_tree(node, width=1000)
+
+    for width in [20, 40, 60, 80]:
+        tree = as_tree(node, width=width)
+        assert "\n".join(iter_tree(node, width=width)) == tree
+        assert ast.dump(eval(tree, ast.__dict__)) == ast.dump(node)
+        if width >= 40:
+            assert "left=Name(ctx=Load(), id='x')," in tree
+            for line in tree.split("\n"):
+                # Only the nodes with a single field cannot be broken
+                assert len(line) <= width or line.strip().startswith("body=[Return(")
+
+    with pytest.raises(ValueError):
+        as_tree(node, width=80, specialized=True)
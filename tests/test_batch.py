@@ -0,0 +1,50 @@
+import ast
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+import pytest
+
+from astprint import as_code, as_tree, as_code_many, as_tree_many
+
+
+def make_nodes(num):
+    return [ast.parse("a{0} = {0}\nb = a{0} + 1".format(i)) for i in range(num)]
+
+
+@pytest.mark.parametrize('executor_cls', [None, ThreadPoolExecutor, ProcessPoolExecutor])
+@pytest.mark.parametrize('chunksize', [1, 3])
+def test_order_preserved(executor_cls, chunksize):
+    nodes = make_nodes(10)
+    expected_code = [as_code(node) for node in nodes]
+    expected_tree = [as_tree(node, indent="\t") for node in nodes]
+
+    if executor_cls is None:
+        code = list(as_code_many(nodes, chunksize=chunksize))
+        tree = list(as_tree_many(nodes, indent="\t", chunksize=chunksize))
+    else:
+        with executor_cls(max_workers=2) as executor:
+            code = list(as_code_many(
+                nodes, executor=executor, chunksize=chunksize, prefetch=1))
+            tree = list(as_tree_many(
+                iter(nodes), indent="\t", executor=executor, chunksize=chunksize))
+
+    assert code == expected_code
+    assert tree == expected_tree
+
+
+def test_results_are_streamed():
+    def nodes():
+        for node in make_nodes(5):
+            yield node
+        raise RuntimeError("consumed too far")
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        results = as_code_many(nodes(), executor=executor, prefetch=2)
+        assert next(results) == "a0 = 0\nb = a0 + 1"
+
+
+def test_wrong_chunksize():
+    # Raised at the call, before any results are requested
+    with pytest.raises(ValueError):
+        as_code_many(make_nodes(1), chunksize=0)
+    with pytest.raises(ValueError):
+        as_tree_many(make_nodes(1), chunksize=0)
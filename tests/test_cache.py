@@ -0,0 +1,134 @@
+import ast
+import gc
+
+from astprint import as_code, as_tree, RenderCache
+from astprint.code import SourceGeneratorNodeVisitor
+
+
+SOURCE = """
+def func(x, a=1):
+    if x > a:
+        return x + a * 2
+    return [x, a, x + a]
+
+
+class A:
+
+    def func(x, a=1):
+        if x > a:
+            return x + a * 2
+        return [x, a, x + a]
+
+    b = [x + 1 for x in range(10)]
+"""
+
+
+def test_code_cache():
+    cache = RenderCache(min_nodes=1)
+    expected = as_code(ast.parse(SOURCE))
+
+    assert as_code(ast.parse(SOURCE), cache=cache) == expected
+    hits = cache.hits
+    misses = cache.misses
+    assert len(cache) > 0
+
+    # A structurally identical tree is taken from the cache entirely
+    # (both top-level statements)
+    assert as_code(ast.parse(SOURCE), cache=cache) == expected
+    assert cache.misses == misses
+    assert cache.hits == hits + 2
+    hits = cache.hits
+
+    # Same for a changed tree, except for the changed parts
+    source = SOURCE.replace("b = [x + 1", "b = [x + 2")
+    assert as_code(ast.parse(source), cache=cache) == as_code(ast.parse(source))
+    assert cache.hits > hits
+
+
+def test_tree_cache():
+    cache = RenderCache(min_nodes=1)
+    node = ast.parse(SOURCE)
+    expected = as_tree(node)
+
+    assert as_tree(node, cache=cache) == expected
+    assert as_tree(node, indent="\t", cache=cache) == as_tree(node, indent="\t")
+    hits = cache.hits
+    misses = cache.misses
+    assert as_tree(node, cache=cache) == expected
+    assert cache.misses == misses
+    assert cache.hits == hits + 2
+
+
+def test_line_alignment():
+    # The same statement placed at a different line is not taken from the cache
+    cache = RenderCache(min_nodes=1)
+    source = "a = b + c * d"
+    as_code(ast.parse(source), cache=cache)
+    shifted = ast.parse("\n\n" + source)
+    assert as_code(shifted, cache=cache) == as_code(shifted)
+
+
+def test_statement_without_visitor():
+    # A statement rendered by `generic_visit` (like `AnnAssign`) leaves
+    # its line break to its first expression, which must not be reused
+    # at another indentation
+    source = "def f():\n    x: int = 2\n    if y:\n        x = 1"
+    node = ast.parse(source)
+    for max_line_gap in [None, 0]:
+        cache = RenderCache(min_nodes=1)
+        assert (as_code(node, cache=cache, max_line_gap=max_line_gap)
+            == as_code(node, max_line_gap=max_line_gap))
+
+
+def test_line_breaking():
+    # Cached statements and expressions keep the places to break the lines at
+    cache = RenderCache(min_nodes=1)
+    node = ast.parse(SOURCE)
+    for _ in range(2):
+        for max_line_length in [10, 20, 80]:
+            assert (as_code(node, cache=cache, max_line_length=max_line_length)
+                == as_code(node, max_line_length=max_line_length))
+    assert cache.hits > 0
+
+
+def test_eviction():
+    cache = RenderCache(max_bytes=1000, min_nodes=1)
+    for i in range(20):
+        node = ast.parse(SOURCE.replace("x + a", "x + a{0}".format(i)))
+        assert as_code(node, cache=cache) == as_code(node)
+    assert cache.evictions > 0
+    assert 0 < cache.size <= 1000
+
+    stats = cache.stats()
+    assert stats['evictions'] == cache.evictions
+    assert stats['entries'] == len(cache)
+
+    cache.clear()
+    assert len(cache) == 0
+    assert cache.size == 0
+
+
+def test_kept_digests():
+    # The digests of a rendered tree are kept while it exists,
+    # and a tree sharing its statements only hashes its new nodes
+    cache = RenderCache(min_nodes=1)
+    node = ast.parse(SOURCE)
+    as_code(node, cache=cache)
+    digests = cache.digests[SourceGeneratorNodeVisitor.digest_attributes]
+    # (operators and contexts like `Load()` may be shared by all the trees)
+    num_nodes = len(set(id(child) for child in ast.walk(node)))
+    assert len(digests) == num_nodes
+
+    changed = ast.Module(body=node.body[:1], type_ignores=[])
+    hits = cache.hits
+    assert as_code(changed, cache=cache) == as_code(changed)
+    assert cache.hits == hits + 1
+    assert len(digests) == num_nodes + 1
+
+    del node, changed
+    gc.collect()
+    assert not any(
+        isinstance(child, (ast.mod, ast.stmt, ast.expr)) for child in digests)
+
+    cache.clear()
+    assert cache.digests == {}
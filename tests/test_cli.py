@@ -0,0 +1,110 @@
+import ast
+import json
+import os
+
+from astprint import as_code, as_json, as_tree
+from astprint import cli
+from astprint.cli import main
+
+
+SOURCES = {
+    'a.py': "def func(x, a=1):\n    return -x + a\n",
+    os.path.join('pkg', 'b.py'): "b = [1, 2, 3]\n",
+    os.path.join('pkg', 'data.txt'): "not a Python file\n",
+}
+
+
+def make_tree(root):
+    for name, source in SOURCES.items():
+        path = root.join(name)
+        path.dirpath().ensure(dir=True)
+        path.write(source)
+
+
+NAMES = ['a.py', os.path.join('pkg', 'b.py')]
+
+
+def expected_stdout(root, render=as_code):
+    # Several results are preceded by the paths of their files
+    return "".join(
+        "# " + str(root.join(name)) + "\n" + render(ast.parse(SOURCES[name]))
+        + "\n" for name in NAMES)
+
+
+def test_stdout(tmpdir, capsys):
+    make_tree(tmpdir)
+    assert main([str(tmpdir)]) == 0
+    out, _ = capsys.readouterr()
+    assert out == expected_stdout(tmpdir)
+
+    assert main([str(tmpdir), '--mode', 'tree']) == 0
+    out, _ = capsys.readouterr()
+    assert out == expected_stdout(tmpdir, as_tree)
+
+    # A single file is written as it is
+    assert main([str(tmpdir.join('a.py'))]) == 0
+    out, _ = capsys.readouterr()
+    assert out == as_code(ast.parse(SOURCES['a.py'])) + "\n"
+
+    # JSON documents are written one per line
+    assert main([str(tmpdir), '--mode', 'json']) == 0
+    out, _ = capsys.readouterr()
+    lines = out.split("\n")
+    assert lines.pop() == ""
+    assert [json.loads(line) for line in lines] == [
+        dict(path=str(tmpdir.join(name)),
+             tree=json.loads(as_json(ast.parse(SOURCES[name]))))
+        for name in NAMES]
+
+
+def test_output_directory(tmpdir, capsys):
+    make_tree(tmpdir.join('src'))
+    output = tmpdir.join('out')
+    for jobs in ['1', '2']:
+        assert main([
+            str(tmpdir.join('src')), '--mode', 'tree', '-o', str(output),
+            '-j', jobs, '--timing']) == 0
+        for name in NAMES:
+            result = output.join(name[:-len('.py')] + '.tree').read()
+            assert result == as_tree(ast.parse(SOURCES[name])) + "\n"
+        _, err = capsys.readouterr()
+        assert "2 files" in err
+
+
+def test_syntax_error(tmpdir, capsys):
+    tmpdir.join('bad.py').write("def (\n")
+    tmpdir.join('good.py').write("a = 1\n")
+    assert main([str(tmpdir)]) == 1
+    out, err = capsys.readouterr()
+    assert out == "# " + str(tmpdir.join('good.py')) + "\na = 1\n"
+    assert "bad.py" in err and "SyntaxError" in err
+
+
+def test_render_error(tmpdir, capsys, monkeypatch):
+    # An unexpected exception in a renderer only fails its own file
+    def render(node, **options):
+        if any(isinstance(item, ast.Global) for item in node.body):
+            raise KeyError("unsupported")
+        return as_code(node, **options)
+
+    monkeypatch.setitem(cli.RENDERERS, 'code', render)
+    tmpdir.join('a.py').write("a = 1\n")
+    tmpdir.join('b.py').write("global x\n")
+    tmpdir.join('c.py').write("c = 3\n")
+    for jobs in ['1', '2']:
+        assert main([str(tmpdir), '-j', jobs]) == 1
+        out, err = capsys.readouterr()
+        assert out == "".join(
+            "# " + str(tmpdir.join(name)) + "\n" + text + "\n"
+            for name, text in [('a.py', "a = 1"), ('c.py', "c = 3")])
+        assert err == str(tmpdir.join('b.py')) + ": KeyError: 'unsupported'\n"
+
+
+def test_cache(tmpdir, capsys):
+    make_tree(tmpdir.join('src'))
+    cache = str(tmpdir.join('cache'))
+    for _ in range(2):
+        assert main([str(tmpdir.join('src')), '--cache', cache]) == 0
+        out, _ = capsys.readouterr()
+        assert out == expected_stdout(tmpdir.join('src'))
+    assert os.listdir(cache)
@@ -0,0 +1,53 @@
+import ast
+
+from astprint import as_tree, tree_diff
+
+
+def test_same():
+    source = "x = 1\ndef f(a):\n    return a + 1\n"
+    assert tree_diff(ast.parse(source), ast.parse(source)) == ""
+    # Line numbers are not a part of the dump
+    assert tree_diff(ast.parse(source), ast.parse("\n\n" + source)) == ""
+
+
+def test_changes():
+    a = ast.parse("x = 1\ndef f(a):\n    return a + 1\nprint(x)\n")
+    b = ast.parse(
+        "x = 2\ndef f(a):\n    return a - 1\ny = 3\nz = 4\nprint(x)\n")
+    assert tree_diff(a, b, width=80).split("\n") == [
+        "Module.body[0].value.value:",
+        "- 1",
+        "+ 2",
+        "Module.body[1].body[0].value.op:",
+        "- Add()",
+        "+ Sub()",
+        "Module.body[2:2]:",
+    ] + ["+ " + line for line in as_tree(b.body[2:4], width=80).split("\n")]
+
+    diff = tree_diff(b, a)
+    assert diff.startswith("Module.body[0].value.value:\n- 2\n+ 1\n")
+    assert diff.endswith(
+        "Module.body[2:4]:\n"
+        + "\n".join("- " + line for line in as_tree(b.body[2:4]).split("\n")))
+
+
+def test_different_classes():
+    a = ast.parse("x = y")
+    b = ast.parse("x = y()")
+    assert tree_diff(a, b).split("\n") == (
+        ["Module.body[0].value:"]
+        + ["- " + line for line in as_tree(a.body[0].value).split("\n")]
+        + ["+ " + line for line in as_tree(b.body[0].value).split("\n")])
+
+
+def test_deep_tree():
+    depth = 10000
+    a = ast.parse("x = 1")
+    b = ast.parse("x = 2")
+    for node in (a, b):
+        value = node.body[0].value
+        for _ in range(depth):
+            value = ast.UnaryOp(op=ast.Not(), operand=value)
+        node.body[0].value = value
+    diff = tree_diff(a, b)
+    assert diff.split("\n")[1:] == ["- 1", "+ 2"]
@@ -0,0 +1,85 @@
+import ast
+import os
+
+import pytest
+
+from astprint import as_code, as_tree, DiskCache, RenderStats, SourceMap
+
+
+SOURCE = """
+def func(x, a=1):
+    return x + a
+"""
+
+
+def test_render(tmpdir):
+    cache = DiskCache(str(tmpdir))
+    node = ast.parse(SOURCE)
+
+    assert cache.as_code(SOURCE) == as_code(node)
+    assert cache.as_code(SOURCE) == as_code(node)
+    assert cache.stats()['hits'] == 1
+
+    # Different options and modes give different entries
+    assert cache.as_code(SOURCE, indent="\t") == as_code(node, indent="\t")
+    assert cache.as_tree(SOURCE) == as_tree(node)
+    assert cache.render(SOURCE.encode(), 'json') is not None
+    assert cache.stats()['hits'] == 1
+
+    # Trees are identified by their structure
+    assert cache.as_tree(node) == as_tree(node)
+    assert cache.as_tree(ast.parse(SOURCE)) == as_tree(node)
+    assert cache.stats()['hits'] == 2
+
+    # The results are shared with other cache objects (and processes)
+    other = DiskCache(str(tmpdir))
+    assert other.as_code(SOURCE) == as_code(node)
+    assert other.stats()['hits'] == 1
+
+
+def test_version(tmpdir, monkeypatch):
+    import astprint
+    cache = DiskCache(str(tmpdir))
+    cache.as_code(SOURCE)
+    monkeypatch.setattr(astprint, '__version__', 'other')
+    cache.as_code(SOURCE)
+    assert cache.stats()['hits'] == 0
+
+
+def test_eviction(tmpdir):
+    cache = DiskCache(str(tmpdir), max_bytes=1000)
+    for i in range(100):
+        cache.as_code("a{0} = {1}".format(i, "x" * 50))
+    assert cache.evictions > 0
+    size = sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, files in os.walk(str(tmpdir)) for name in files)
+    assert size <= 1000
+
+    # The most recent entries are kept
+    cache.as_code("a99 = " + "x" * 50)
+    assert cache.stats()['hits'] == 1
+
+    cache.clear()
+    assert not any(files for _, _, files in os.walk(str(tmpdir)))
+
+
+def test_syntax_error(tmpdir):
+    cache = DiskCache(str(tmpdir))
+    with pytest.raises(SyntaxError):
+        cache.as_code("def (")
+    assert not any(files for _, _, files in os.walk(str(tmpdir)))
+
+
+def test_unsupported_options(tmpdir):
+    cache = DiskCache(str(tmpdir))
+    for options in [dict(source_map=SourceMap()), dict(stats=RenderStats()),
+                    dict(line_map=[]), dict(rope=True),
+                    dict(max_line_gap=1, line_map=[])]:
+        with pytest.raises(TypeError):
+            cache.as_code(SOURCE, **options)
+    assert list(cache._entries()) == []
+
+    assert cache.as_code(SOURCE, max_line_gap=1) == as_code(
+        ast.parse(SOURCE), max_line_gap=1)
+    assert cache.as_tree(SOURCE, specialized=True) == as_tree(ast.parse(SOURCE))
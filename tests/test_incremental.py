@@ -0,0 +1,71 @@
+import ast
+import copy
+import weakref
+
+from astprint import as_code, as_code_incremental
+
+
+def make_module(num_funcs):
+    source = "\n\n".join(
+        "def func{0}(x):\n    y = x * {0}\n    if y > 0:\n        return y + 1\n    return y"
+        .format(i) for i in range(num_funcs))
+    return ast.parse(source)
+
+
+class ChangeConstant(ast.NodeTransformer):
+
+    def __init__(self, func_name, value):
+        self.func_name = func_name
+        self.value = value
+
+    def visit_FunctionDef(self, node):
+        if node.name == self.func_name:
+            node.body[1].body[0].value.right = ast.Constant(value=self.value)
+        return node
+
+
+def test_incremental():
+    tree = make_module(10)
+    result = as_code_incremental(tree)
+    assert result.code == str(result) == as_code(tree)
+    assert result.reused == 0
+
+    for value, name in enumerate(["func3", "func7", "func3"]):
+        tree = ChangeConstant(name, value + 2).visit(tree)
+        ast.fix_missing_locations(tree)
+        result = as_code_incremental(tree, previous=result)
+        assert result.code == as_code(tree)
+        # The function, the `if` and the `return` in it are rendered again
+        assert result.rendered == 3
+        # The other functions and the unchanged statements in the changed one
+        assert result.reused == 9 + 2
+
+
+def test_incremental_line_shift():
+    tree = make_module(3)
+    result = as_code_incremental(tree)
+    # Shifting the statements forces the line alignment to pad them differently
+    ast.increment_lineno(tree.body[1], 5)
+    ast.increment_lineno(tree.body[2], 5)
+    result = as_code_incremental(tree, previous=result)
+    assert result.code == as_code(tree)
+    assert result.reused == 1
+
+
+def test_memo():
+    # With a memo, the changed nodes are replaced instead of being changed
+    tree = make_module(10)
+    memo = weakref.WeakKeyDictionary()
+    result = as_code_incremental(tree, memo=memo)
+    assert result.code == as_code(tree)
+
+    for value, name in enumerate(["func3", "func7", "func3"]):
+        tree = copy.copy(tree)
+        tree.body = list(tree.body)
+        index = int(name[4:])
+        func = tree.body[index] = copy.deepcopy(tree.body[index])
+        func.body[1].body[0].value.right.value = value + 2
+        result = as_code_incremental(tree, previous=result, memo=memo)
+        assert result.code == as_code(tree)
+        assert result.rendered == 3
+        assert result.reused == 9 + 2
@@ -0,0 +1,71 @@
+import ast
+import io
+import json
+
+import pytest
+
+from astprint import as_json, write_json, write_ndjson
+
+
+SOURCE = """
+def func(x, a=1):
+    if x > a:
+        return x + a * 2j
+    return [x, a, b'\\xff\\x00', 'str\\u1234', ..., 1e1000, None, True]
+
+global c, d
+"""
+
+
+def from_json(obj):
+    if isinstance(obj, list):
+        return [from_json(item) for item in obj]
+    elif isinstance(obj, dict):
+        if '_literal' in obj:
+            kind = obj['_literal']
+            if kind == 'bytes':
+                return obj['value'].encode('latin-1')
+            elif kind == 'complex':
+                return complex(*obj['value'])
+            elif kind == 'float':
+                return float(obj['value'])
+            elif kind == 'Ellipsis':
+                return Ellipsis
+        node = getattr(ast, obj['_type'])()
+        for name, value in obj.items():
+            if name != '_type':
+                setattr(node, name, from_json(value))
+        return node
+    else:
+        return obj
+
+
+def test_as_json():
+    node = ast.parse(SOURCE)
+    obj = json.loads(as_json(node))
+    assert obj['_type'] == 'Module'
+    assert list(obj['body'][0]) == ['_type', 'args', 'body', 'decorator_list', 'name', 'returns', 'type_comment']
+    assert ast.dump(from_json(obj)) == ast.dump(node)
+
+
+def test_write_json():
+    node = ast.parse(SOURCE)
+    fp = io.StringIO()
+    write_json(node, fp, buffer_size=10)
+    assert fp.getvalue() == as_json(node)
+
+
+def test_write_ndjson():
+    node = ast.parse(SOURCE)
+    fp = io.StringIO()
+    write_ndjson(node, fp)
+    lines = fp.getvalue().split("\n")
+    assert lines[-1] == ""
+    assert lines[:-1] == [as_json(stmt) for stmt in node.body]
+    for line, stmt in zip(lines, node.body):
+        assert ast.dump(from_json(json.loads(line))) == ast.dump(stmt)
+
+
+def test_unknown_literal():
+    with pytest.raises(TypeError):
+        as_json(ast.Constant(value=object()))
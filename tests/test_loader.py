@@ -0,0 +1,65 @@
+import ast
+import io
+import sys
+
+import pytest
+
+from astprint import as_tree, load_tree
+
+
+SOURCE = """
+def func(x, a=1, *args, **kwds):
+    if x > -a:
+        return x + a * 2j
+    return [x, a, b'\\xff\\x00', 'str\\u1234"\\'', ..., 1e1000, -1e1000, 1.5e-10, None, True]
+
+global c, d
+a = (1+2j, 10 ** 100, 0.1, {'a': 1}, lambda: None)
+"""
+
+
+def test_load_tree():
+    node = ast.parse(SOURCE)
+    assert ast.dump(load_tree(as_tree(node))) == ast.dump(node)
+    assert ast.dump(load_tree(as_tree(node, indent="\t"))) == ast.dump(node)
+    assert ast.dump(load_tree(ast.dump(node))) == ast.dump(node)
+
+
+def test_load_tree_stdlib():
+    with open(ast.__file__) as f:
+        node = ast.parse(f.read())
+    assert ast.dump(load_tree(as_tree(node))) == ast.dump(node)
+
+
+def test_load_tree_from_file():
+    node = ast.parse(SOURCE)
+    fp = io.StringIO(as_tree(node))
+    assert ast.dump(load_tree(fp)) == ast.dump(node)
+
+
+def test_load_deep_tree():
+    # Too deep for eval()
+    depth = sys.getrecursionlimit() * 2
+    expr = ast.Name(id='a', ctx=ast.Load())
+    for _ in range(depth):
+        expr = ast.UnaryOp(op=ast.USub(), operand=expr)
+    loaded = load_tree(as_tree(expr))
+    for _ in range(depth):
+        assert isinstance(loaded, ast.UnaryOp)
+        loaded = loaded.operand
+    assert loaded.id == 'a'
+
+
+@pytest.mark.parametrize('text', [
+    "os(name='x')",
+    "Name(id='x'",
+    "Name(id='x'))",
+    "Name(id='x']",
+    "Name('x')",
+    "Name(id=x)",
+    "Name(id='x') Name(id='y')",
+    "",
+])
+def test_load_tree_errors(text):
+    with pytest.raises(ValueError):
+        load_tree(text)
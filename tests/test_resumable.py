@@ -0,0 +1,78 @@
+import ast
+import threading
+
+import pytest
+
+from astprint import as_code, as_tree, ResumableRenderer, RenderCancelled
+
+
+SOURCE = "\n".join(
+    "\n\ndef func{0}(x, a=1):\n    return [x + a * {0}, call(x)]".format(i)
+    for i in range(50))
+
+
+def render_in_steps(renderer, **budget):
+    pieces = []
+    while not renderer.done:
+        pieces.append(renderer.run(**budget))
+    return pieces
+
+
+@pytest.mark.parametrize('mode, func', [('code', as_code), ('tree', as_tree)])
+def test_budgets(mode, func):
+    node = ast.parse(SOURCE)
+    expected = func(node)
+
+    renderer = ResumableRenderer(node, mode)
+    pieces = render_in_steps(renderer, max_nodes=7)
+    assert "".join(pieces) == expected
+    assert len(pieces) > 10
+    nodes = renderer.nodes
+    assert renderer.characters == len(expected)
+    assert renderer.run() == ""
+
+    renderer = ResumableRenderer(node, mode, indent="\t")
+    pieces = render_in_steps(renderer, max_characters=100)
+    assert "".join(pieces) == func(node, "\t")
+    assert len(pieces) > 10
+
+    renderer = ResumableRenderer(node, mode)
+    assert "".join(render_in_steps(renderer, max_seconds=0.0001)) == expected
+
+    renderer = ResumableRenderer(node, mode)
+    assert renderer.run() == expected
+    assert renderer.done
+    assert renderer.nodes == nodes
+
+
+def test_cancel():
+    renderer = ResumableRenderer(ast.parse(SOURCE))
+    assert renderer.run(max_nodes=10)
+    renderer.cancel()
+    assert renderer.cancelled
+    with pytest.raises(RenderCancelled):
+        renderer.run()
+
+
+def test_cancel_from_another_thread():
+    node = ast.Module(body=[ast.parse(SOURCE).body[0]] * 20000)
+    renderer = ResumableRenderer(node)
+    started = threading.Event()
+
+    def cancel():
+        started.wait()
+        renderer.cancel()
+
+    thread = threading.Thread(target=cancel)
+    thread.start()
+    assert renderer.run(max_nodes=10)
+    started.set()
+    with pytest.raises(RenderCancelled):
+        renderer.run()
+    thread.join()
+    assert renderer.nodes < len(list(ast.walk(node)))
+
+
+def test_unknown_mode():
+    with pytest.raises(ValueError):
+        ResumableRenderer(ast.parse(SOURCE), 'json')
@@ -0,0 +1,79 @@
+import ast
+import io
+
+from astprint import as_code, as_tree, Rope, SourceMap, RenderStats
+
+
+SOURCE = "\n".join(
+    "\n\ndef func{0}(x, a=1):\n    return [x + a * {0}, call(x)]".format(i)
+    for i in range(20))
+
+
+def test_as_code():
+    node = ast.parse(SOURCE)
+    expected = as_code(node)
+    rope = as_code(node, rope=True)
+    assert isinstance(rope, Rope)
+    assert str(rope) == expected
+    assert len(rope) == len(expected)
+    assert len(rope.chunks) > 100
+
+    for kwds in [dict(max_line_length=20), dict(max_line_gap=0)]:
+        assert str(as_code(node, rope=True, **kwds)) == as_code(node, **kwds)
+
+    source_map = SourceMap()
+    stats = RenderStats()
+    rope = as_code(node, rope=True, source_map=source_map, stats=stats)
+    assert source_map.span(node.body[1]) == _source_map(node).span(
+        node.body[1])
+    assert stats.characters == len(expected)
+
+
+def _source_map(node):
+    source_map = SourceMap()
+    as_code(node, source_map=source_map)
+    return source_map
+
+
+def test_as_tree():
+    node = ast.parse(SOURCE)
+    for kwds in [{}, dict(specialized=True), dict(width=60)]:
+        assert str(as_tree(node, rope=True, **kwds)) == as_tree(node, **kwds)
+
+
+def test_lines():
+    node = ast.parse(SOURCE)
+    text = as_code(node)
+    rope = as_code(node, rope=True)
+    lines = text.split("\n")
+    assert rope.line_count() == len(lines)
+    for start, stop in [(0, None), (0, 1), (3, 7), (5, 5), (-4, None),
+                        (len(lines) - 1, len(lines) + 10), (100, 200)]:
+        assert rope.lines(start, stop) == lines[start:stop]
+
+
+def test_strip_newlines():
+    rope = Rope(["\n", "\n\na", "\n", "b\n", "\n", ""])
+    assert rope.strip_newlines() == 3
+    assert str(rope) == "a\nb"
+    assert len(rope) == 3
+    assert rope.lines() == ["a", "b"]
+
+    rope = Rope(["\n", "\n"])
+    assert rope.strip_newlines() == 2
+    assert str(rope) == ""
+    assert rope.lines() == [""]
+
+
+def test_output():
+    node = ast.parse(SOURCE)
+    expected = as_code(node)
+    rope = as_code(node, rope=True)
+
+    fp = io.StringIO()
+    rope.writelines(fp)
+    assert fp.getvalue() == expected
+
+    blocks = list(rope.encode(block_size=100))
+    assert len(blocks) > 1
+    assert b"".join(blocks) == expected.encode('utf-8')
@@ -0,0 +1,81 @@
+import ast
+
+from astprint import as_code, SourceMap
+
+
+SOURCE = """def func(x, a=1):
+    if x > a:
+        return x + a * 2
+    return [x, a]
+
+
+b = func(3)
+"""
+
+
+def test_spans():
+    node = ast.parse(SOURCE)
+    source_map = SourceMap()
+    code = as_code(node, source_map=source_map)
+    assert code == as_code(node)
+
+    names = [n for n in source_map.nodes if isinstance(n, ast.Name)]
+    assert len(names) == 8
+    for i, mapped in enumerate(source_map.nodes):
+        text = code[source_map.starts[i]:source_map.ends[i]]
+        if isinstance(mapped, ast.Name):
+            assert text == mapped.id
+        elif isinstance(mapped, ast.stmt):
+            assert ast.dump(ast.parse(ast.unparse(mapped))) == ast.dump(ast.parse(text.strip()))
+
+    func = node.body[0]
+    return_stmt = func.body[0].body[0]
+    line, column, end_line, end_column = source_map.span(return_stmt)
+    assert code.split("\n")[line - 1][column:end_column] == "return x + a * 2"
+    assert line == end_line
+    assert source_map.span(ast.Name(id='x')) is None
+
+
+def test_lookup():
+    node = ast.parse(SOURCE)
+    source_map = SourceMap()
+    code = as_code(node, source_map=source_map)
+    lines = code.split("\n")
+
+    # Line alignment keeps the statements at their original lines
+    return_stmt = node.body[0].body[0].body[0]
+    line = return_stmt.lineno
+    column = lines[line - 1].index("a * 2")
+    found = source_map.node_at_position(line, column)
+    assert isinstance(found, ast.Name) and found.id == 'a'
+
+    # An operator is not visited, so the innermost node is the operation
+    found = source_map.node_at_position(line, column + 2)
+    assert isinstance(found, ast.BinOp) and isinstance(found.op, ast.Mult)
+
+    offset = code.index("func(3)") + 4
+    assert isinstance(source_map.node_at(offset), ast.Call)
+    assert source_map.position(offset) == (node.body[1].lineno, 8)
+
+    # Between the statements, only the module is there
+    assert source_map.node_at(code.index("\n\nb = ")) is node
+    assert source_map.node_at(len(code)) is None
+
+
+def test_reuse():
+    source_map = SourceMap()
+    first = ast.parse(SOURCE)
+    as_code(first, source_map=source_map)
+    assert source_map.span(first.body[1]) is not None
+
+    node = ast.parse("x = y\nz = 1")
+    as_code(node, source_map=source_map)
+    fresh = SourceMap()
+    as_code(node, source_map=fresh)
+
+    assert source_map.nodes == fresh.nodes
+    assert list(source_map.line_starts) == list(fresh.line_starts) == [0, 6]
+    assert list(source_map.segment_starts) == list(fresh.segment_starts)
+    assert source_map.span(node.body[1]) == (2, 0, 2, 5)
+    assert source_map.span(first.body[1]) is None
+    assert source_map.node_at_position(1, 4) is node.body[0].value
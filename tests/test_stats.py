@@ -0,0 +1,45 @@
+import ast
+
+from astprint import as_code, as_tree, RenderStats
+
+
+SOURCE = """
+def func(x, a=1):
+    if x > a:
+        return x + a * 2
+    return [x, a]
+"""
+
+
+def test_code_stats():
+    node = ast.parse(SOURCE)
+    stats = RenderStats()
+    code = as_code(node, stats=stats)
+    assert code == as_code(node)
+
+    assert stats.nodes['Name'] == 6
+    assert stats.nodes['Return'] == 2
+    assert stats.calls['visit_Name'] == 6
+    assert stats.characters == len(code)
+    # Module -> FunctionDef -> If -> Return -> BinOp -> BinOp -> Name
+    assert stats.max_depth == 7
+    assert stats.times['visit_BinOp'] > 0
+    assert 0 < stats.total_time()
+    assert 'visit_Name' in stats.report()
+
+
+def test_tree_stats():
+    node = ast.parse(SOURCE)
+    stats = RenderStats()
+    tree = as_tree(node, stats=stats)
+    assert tree == as_tree(node)
+
+    assert stats.nodes['Name'] == 6
+    assert stats.nodes['list'] > 0
+    assert set(stats.calls) == set(['generic_visit'])
+    assert stats.characters == len(tree)
+
+    # Statistics accumulate
+    as_tree(node, stats=stats)
+    assert stats.nodes['Name'] == 12
+    assert stats.characters == 2 * len(tree)
@@ -0,0 +1,53 @@
+import ast
+import weakref
+
+from astprint import fingerprint, tree_diff
+from astprint.structure import subtree_digests
+
+
+SOURCE = "x = 1\ndef f(a):\n    return a + 1\n"
+
+
+def test_fingerprint():
+    node = ast.parse(SOURCE)
+    digest = fingerprint(node)
+    assert digest == subtree_digests(node)[id(node)][0]
+    assert fingerprint(ast.parse("\n\n" + SOURCE)) == digest
+    assert fingerprint(ast.parse(SOURCE.replace("1", "2"))) != digest
+    # A string and a number with the same repr() differ
+    assert fingerprint(ast.parse("x = '1'")) != fingerprint(ast.parse("x = 1"))
+
+    assert fingerprint(node, attributes=('lineno',)) != fingerprint(
+        ast.parse("\n\n" + SOURCE), attributes=('lineno',))
+
+
+def test_memo():
+    node = ast.parse(SOURCE)
+    memo = {}
+    digest = fingerprint(node, memo)
+    assert digest == fingerprint(node)
+    assert len(memo) == len(list(ast.walk(node)))
+    for child in ast.walk(node):
+        assert fingerprint(child, memo) == fingerprint(child)
+
+    # Subtrees found in the memo are not traversed again
+    module = ast.Module(body=[node.body[0]])
+    memo[node.body[0]] = ("fake", 1)
+    assert fingerprint(module, memo) != fingerprint(module)
+
+    weak_memo = weakref.WeakKeyDictionary()
+    assert fingerprint(node, weak_memo) == digest
+    size = len(weak_memo)
+    del node, child, module, memo
+    # Only the shared context nodes (like `Load()`) may be left
+    assert len(weak_memo) < size / 2
+
+
+def test_diff_memo():
+    a = ast.parse(SOURCE)
+    memo = {}
+    b = ast.Module(body=[a.body[0], ast.parse("y = 2").body[0]])
+    assert tree_diff(a, b, memo=memo).startswith("Module.body[1]:\n")
+    # The fingerprints of the shared statement were computed once
+    assert a.body[0] in memo
+    assert tree_diff(a, a, memo=memo) == ""